@@ -0,0 +1,225 @@
+import numpy as np
+import pandas as pd
+
+# The allocation methods: PyPortfolioOpt's greedy_portfolio, a
+# vectorized approximation of it, and an exact integer program
+METHODS = ["greedy", "rounding", "exact"]
+# Budgets from $1,000 to $10,000,000, evenly spaced on a log scale
+BUDGETS = np.logspace(3, 7, 25)
+# The time in seconds the exact method may spend on one budget, after
+# which it keeps the best allocation found so far
+EXACT_TIME_LIMIT = 10.0
+
+
+def allocate(weights, latest_prices, investment, method="greedy"):
+    """
+    Converts portfolio weights into a number of shares to buy of
+    each stock for one investment.
+
+    Args:
+        weights (dict): The weight of each stock in the portfolio.
+        latest_prices (pd.Series): The latest price of each stock.
+        investment (float): The total amount to invest.
+        method (str, optional): The allocation method, one of
+        `METHODS`.
+
+    Returns:
+        dict: The number of shares to buy of each stock, leaving out
+        stocks with no shares.
+        float: The funds remaining after buying the shares.
+    """
+    shares, leftover = allocate_many(
+        weights, latest_prices, [investment], method
+    )
+    row = shares.iloc[0]
+    return {
+        ticker: int(count) for ticker, count in row[row > 0].items()
+    }, float(leftover.iloc[0])
+
+
+def allocate_many(weights, latest_prices, budgets, method="rounding"):
+    """
+    Converts one set of portfolio weights into shares for many
+    budgets at once.
+
+    The greedy method runs PyPortfolioOpt's greedy_portfolio once for
+    every budget. The rounding method follows the same two rounds for
+    every budget together, with array operations: it buys the whole
+    number of shares below each stock's target value, then spends the
+    remaining cash one share at a time on the affordable stock furthest
+    below its target weight, until no affordable stock is below it.
+    Its result only differs from greedy's where stocks are equally far
+    below their targets, and it is much faster for a long list of
+    budgets.
+
+    The exact method solves, for every budget, the integer program of
+    PyPortfolioOpt's lp_portfolio: minimise the remaining funds plus
+    the total distance of each stock's value from its target. It is
+    solved with scipy's HiGHS solver rather than cvxpy's ECOS_BB,
+    which is much slower and often stops at an inaccurate solution.
+    Large portfolios can take too long to solve exactly, so the best
+    allocation found within `EXACT_TIME_LIMIT` seconds is kept.
+
+    Args:
+        weights (dict): The weight of each stock in the portfolio.
+        latest_prices (pd.Series): The latest price of each stock.
+        budgets (list): The total amounts to invest.
+        method (str, optional): The allocation method, one of
+        `METHODS`.
+
+    Returns:
+        pd.DataFrame: The number of shares of each stock (columns) for
+        each budget (rows).
+        pd.Series: The funds remaining for each budget.
+
+    Raises:
+        ValueError: If the method is unknown or a budget is not
+        positive.
+    """
+    if method not in METHODS:
+        raise ValueError(f"the allocation method must be one of {METHODS}")
+    budgets = np.asarray(budgets, dtype=float)
+    if (budgets <= 0).any():
+        raise ValueError("every budget must be greater than 0")
+    tickers = list(weights)
+    target = np.array([weights[ticker] for ticker in tickers])
+    prices = latest_prices[tickers].to_numpy(dtype=float)
+
+    if method == "rounding":
+        shares, leftover = _rounding(target, prices, budgets)
+    else:
+        shares = np.zeros((len(budgets), len(tickers)))
+        for row, budget in enumerate(budgets):
+            if method == "greedy":
+                shares[row] = _greedy(weights, latest_prices[tickers], budget)
+            else:
+                shares[row] = _exact(target, prices, budget)
+        leftover = budgets - shares @ prices
+
+    index = pd.Index(budgets, name="budget")
+    return (
+        pd.DataFrame(shares.astype(int), index=index, columns=tickers),
+        pd.Series(leftover, index=index, name="leftover"),
+    )
+
+
+def _rounding(target, prices, budgets):
+    shares = np.floor(np.outer(budgets, target) / prices)
+    leftover = budgets - shares @ prices
+
+    # Then, as greedy_portfolio does, buy one share at a time of the
+    # affordable stock furthest below its target weight, for every
+    # budget at once, until no affordable stock is below its target
+    rows = np.arange(len(budgets))
+    while len(rows):
+        value = shares[rows] * prices
+        invested = value.sum(axis=1, keepdims=True)
+        weight = np.divide(
+            value, invested, out=np.zeros_like(value), where=invested > 0
+        )
+        deficit = np.where(
+            prices <= leftover[rows, None], target - weight, -np.inf
+        )
+        column = deficit.argmax(axis=1)
+        buy = deficit[np.arange(len(rows)), column] > 0
+        rows, column = rows[buy], column[buy]
+        shares[rows, column] += 1
+        leftover[rows] -= prices[column]
+    return shares, leftover
+
+
+def _greedy(weights, latest_prices, budget):
+    from pypfopt.discrete_allocation import DiscreteAllocation
+
+    allocation, _ = DiscreteAllocation(
+        weights, latest_prices, total_portfolio_value=budget
+    ).greedy_portfolio()
+    return [allocation.get(ticker, 0) for ticker in latest_prices.index]
+
+
+def _exact(target, prices, budget):
+    """
+    Solves lp_portfolio's integer program for one budget. The
+    variables are the shares of each stock, the distance of each
+    stock's value from its target and the remaining funds.
+    """
+    from scipy.optimize import Bounds, LinearConstraint, milp
+
+    n = len(prices)
+    target_value = target * budget
+    identity = np.eye(n)
+    zeros = np.zeros((n, 1))
+    constraints = [
+        # The distance is at least the value above or below the target
+        LinearConstraint(
+            np.block([[np.diag(prices), -identity, zeros],
+                      [-np.diag(prices), -identity, zeros]]),
+            -np.inf,
+            np.r_[target_value, -target_value],
+        ),
+        # The shares and the remaining funds add up to the budget
+        LinearConstraint(np.r_[prices, np.zeros(n), 1], budget, budget),
+    ]
+    result = milp(
+        np.r_[np.zeros(n), np.ones(n + 1)],
+        constraints=constraints,
+        integrality=np.r_[np.ones(n), np.zeros(n + 1)],
+        bounds=Bounds(0, np.inf),
+        options={"time_limit": EXACT_TIME_LIMIT},
+    )
+    if result.x is None:
+        raise ValueError(f"the exact allocation failed: {result.message}")
+    return np.rint(result.x[:n])
+
+
+def budget_sweep(
+    weights, latest_prices, cov=None, budgets=BUDGETS, method="rounding"
+):
+    """
+    Allocates one portfolio for a range of budgets and reports how
+    closely each allocation follows the target weights.
+
+    The tracking error of an allocation is the annual volatility of
+    the difference between its weights and the target weights, with
+    uninvested cash treated as having no volatility.
+
+    Args:
+        weights (dict): The weight of each stock in the portfolio.
+        latest_prices (pd.Series): The latest price of each stock.
+        cov (pd.DataFrame, optional): The annualised covariance of the
+        stocks' returns. The tracking error is NaN without it.
+        budgets (list, optional): The total amounts to invest. Defaults
+        to `BUDGETS`, $1,000 to $10,000,000 on a log scale.
+        method (str, optional): The allocation method, one of
+        `METHODS`.
+
+    Returns:
+        pd.DataFrame: The amount invested, funds remaining, fraction of
+        the budget remaining and tracking error (columns) of each
+        budget (rows).
+        pd.DataFrame: The number of shares of each stock (columns) for
+        each budget (rows).
+    """
+    shares, leftover = allocate_many(weights, latest_prices, budgets, method)
+    tickers = list(shares.columns)
+    budget = shares.index.to_numpy()
+    value = shares.to_numpy() * latest_prices[tickers].to_numpy()
+    difference = value / budget[:, None] - [weights[t] for t in tickers]
+    if cov is None:
+        tracking_error = np.full(len(budget), np.nan)
+    else:
+        tracking_error = np.sqrt(np.einsum(
+            "ij,jk,ik->i",
+            difference,
+            cov.loc[tickers, tickers].to_numpy(),
+            difference,
+        ))
+    return pd.DataFrame(
+        {
+            "invested": value.sum(axis=1),
+            "leftover": leftover.to_numpy(),
+            "leftover_fraction": leftover.to_numpy() / budget,
+            "tracking_error": tracking_error,
+        },
+        index=shares.index,
+    ), shares
@@ -0,0 +1,416 @@
+"""
+An HTTP/JSON service for the ranking, portfolio and allocation steps
+of InvestIQ, so that dashboards and batch clients can query them
+without running the interactive program.
+
+The data of each index comes from the refresher's snapshots (see
+refresher.py), which every process on the host shares. Requests are
+computed in a thread pool so the event loop keeps accepting
+connections, and identical requests that arrive while one is being
+computed wait for its result rather than computing it again (single
+flight). A burst of clients asking for the same ranking or portfolio
+therefore costs one computation.
+
+Endpoints:
+    GET  /health
+    GET  /ranking?index=dow
+    POST /ranking with {"fundamentals": [{"symbol": ..., ...}, ...]}
+    GET  /portfolio?index=dow&size=10
+    GET  /allocation?index=dow&size=10&budget=10000&method=greedy
+
+Usage:
+    python api.py [--host HOST] [--port PORT]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+import urllib.parse
+
+import pandas as pd
+
+from allocation import METHODS, allocate
+from optimizer import RiskModel
+from ranking import FACTORS
+from refresher import get_snapshot
+from utils import INDEX_URLS, rank_companies
+
+# The address the service listens on
+HOST = os.environ.get("INVESTIQ_API_HOST", "127.0.0.1")
+PORT = int(os.environ.get("INVESTIQ_API_PORT", 8080))
+# The largest request body accepted, in bytes
+MAX_BODY = 10 * 1024 * 1024
+# How long, in seconds, a loaded snapshot is used before checking
+# whether the refresher has published a newer one
+SNAPSHOT_TTL = 60.0
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class RequestError(ValueError):
+    """An error in a request, answered with 400 Bad Request."""
+
+
+class SingleFlight:
+    """
+    Runs a function in the event loop's thread pool once for all the
+    concurrent callers that ask for the same key.
+
+    The first caller with a key starts the call, and callers with the
+    same key that arrive before it finishes wait for the same result,
+    or the same exception. Results are not kept once the call has
+    finished, so a later caller computes the result again.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key, function, *args):
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.get_running_loop().run_in_executor(
+                None, function, *args
+            )
+            self._calls[key] = call
+            call.add_done_callback(lambda _: self._forget(key, call))
+            self.calls += 1
+        else:
+            self.shared += 1
+        # A caller that disconnects must not cancel the others' call
+        return await asyncio.shield(call)
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+
+class ApiService:
+    """
+    The endpoints of the service, computed from the refresher's
+    snapshots.
+
+    Args:
+        snapshot_ttl (float, optional): How long, in seconds, a loaded
+        snapshot is used before checking for a newer one.
+    """
+
+    def __init__(self, snapshot_ttl=SNAPSHOT_TTL):
+        self.snapshot_ttl = snapshot_ttl
+        self.flights = SingleFlight()
+        self._snapshots = {}
+        self.started = time.time()
+
+    async def handle(self, method, target, body):
+        """
+        Answers one request.
+
+        Args:
+            method (str): The HTTP method.
+            target (str): The path and query string of the request.
+            body (bytes): The body of the request.
+
+        Returns:
+            int: The HTTP status code.
+            bytes: The JSON body of the response.
+        """
+        url = urllib.parse.urlsplit(target)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        routes = {
+            "/health": {"GET": self._health},
+            "/ranking": {"GET": self._index_ranking, "POST": self._ranking},
+            "/portfolio": {"GET": self._portfolio},
+            "/allocation": {"GET": self._allocation},
+        }
+        if url.path not in routes:
+            return _error(404, f"no endpoint at {url.path}")
+        if method not in routes[url.path]:
+            return _error(405, f"{url.path} does not accept {method}")
+        try:
+            return 200, await routes[url.path][method](params, body)
+        except RequestError as e:
+            return _error(400, str(e))
+        except Exception as e:
+            return _error(500, repr(e))
+
+    async def _health(self, params, body):
+        return _encode({
+            "status": "ok",
+            "uptime": time.time() - self.started,
+            "calls": self.flights.calls,
+            "shared_calls": self.flights.shared,
+        })
+
+    async def _index_ranking(self, params, body):
+        index = _index(params)
+        return await self.flights.do(
+            ("ranking", index), self.index_ranking, index
+        )
+
+    async def _ranking(self, params, body):
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            raise RequestError("the body must be JSON") from None
+        records = request.get("fundamentals") if isinstance(
+            request, dict
+        ) else None
+        if not isinstance(records, list) or not all(
+            isinstance(record, dict) and "symbol" in record
+            for record in records
+        ):
+            raise RequestError(
+                "the body must have a 'fundamentals' list of objects,"
+                " each with a 'symbol'"
+            )
+        key = hashlib.sha256(
+            json.dumps(records, sort_keys=True).encode()
+        ).hexdigest()
+        return await self.flights.do(("ranking", key), _rank, records)
+
+    async def _portfolio(self, params, body):
+        index = _index(params)
+        size = _number(params, "size", 10, int)
+        return await self.flights.do(
+            ("portfolio", index, size), self.portfolio, index, size
+        )
+
+    async def _allocation(self, params, body):
+        index = _index(params)
+        size = _number(params, "size", 10, int)
+        budget = _number(params, "budget", 10000, float)
+        method = params.get("method", "greedy")
+        if method not in METHODS:
+            raise RequestError(f"the method must be one of {METHODS}")
+        return await self.flights.do(
+            ("allocation", index, size, budget, method),
+            self.allocation, index, size, budget, method,
+        )
+
+    def snapshot(self, index):
+        """
+        Returns the snapshot of an index, loading it again once it is
+        older than `snapshot_ttl` seconds in this process.
+        """
+        loaded = self._snapshots.get(index)
+        if loaded is None or time.time() - loaded[1] > self.snapshot_ttl:
+            loaded = (get_snapshot(index), time.time())
+            self._snapshots[index] = loaded
+        return loaded[0]
+
+    def index_ranking(self, index):
+        """The ranked companies of an index, as JSON."""
+        snapshot = self.snapshot(index)
+        return _encode({
+            "index": index,
+            "refreshed": snapshot.refreshed,
+            "removed_companies": int(snapshot.removed),
+            "ranking": _records(snapshot.ranking),
+        })
+
+    def portfolio(self, index, size):
+        """
+        The HRP portfolio of the `size` highest ranked companies of an
+        index, as JSON.
+        """
+        return _encode(self._portfolio_results(index, size)[0])
+
+    def allocation(self, index, size, budget, method):
+        """
+        The HRP portfolio of the `size` highest ranked companies of an
+        index and its allocation into shares for a budget, as JSON.
+        """
+        if not 0 < budget < float("inf"):
+            raise RequestError("the budget must be greater than 0")
+        results, weights, latest_prices = self._portfolio_results(
+            index, size
+        )
+        shares, leftover = allocate(weights, latest_prices, budget, method)
+        results.update({
+            "budget": budget,
+            "method": method,
+            "allocation": shares,
+            "leftover": leftover,
+        })
+        return _encode(results)
+
+    def _portfolio_results(self, index, size):
+        from pypfopt.discrete_allocation import get_latest_prices
+
+        snapshot = self.snapshot(index)
+        if size < 3 or size > len(snapshot.ranking):
+            raise RequestError(
+                "the portfolio size must be between 3 and"
+                f" {len(snapshot.ranking)}"
+            )
+        symbols = snapshot.ranking["symbols"].head(size).tolist()
+        prices = snapshot.prices[symbols]
+        risk_model = RiskModel(prices)
+        weights = risk_model.hrp()
+        expected_return, volatility, sharpe = risk_model.performance(weights)
+        return {
+            "index": index,
+            "refreshed": snapshot.refreshed,
+            "size": size,
+            "weights": {
+                ticker: float(weight) for ticker, weight in weights.items()
+            },
+            "performance": {
+                "expected_annual_return": float(expected_return),
+                "annual_volatility": float(volatility),
+                "sharpe_ratio": float(sharpe),
+            },
+        }, weights, get_latest_prices(prices)
+
+
+def _index(params):
+    index = params.get("index", "dow")
+    if index not in INDEX_URLS:
+        raise RequestError(
+            f"the index must be one of {sorted(INDEX_URLS)}"
+        )
+    return index
+
+
+def _number(params, name, default, kind):
+    try:
+        return kind(params.get(name, default))
+    except ValueError:
+        raise RequestError(f"the {name} must be a number") from None
+
+
+def _rank(records):
+    fundamentals_data = pd.DataFrame.from_records(records)
+    missing = set(["symbol"] + FACTORS) - set(fundamentals_data.columns)
+    if missing:
+        raise RequestError(
+            f"the fundamentals are missing {', '.join(sorted(missing))}"
+        )
+    try:
+        fundamentals_data[FACTORS] = fundamentals_data[FACTORS].apply(
+            pd.to_numeric
+        )
+    except (TypeError, ValueError):
+        raise RequestError("the factors must be numbers or null") from None
+    ranking, removed_companies = rank_companies(fundamentals_data)
+    return _encode({
+        "removed_companies": int(removed_companies),
+        "ranking": _records(ranking),
+    })
+
+
+def _records(frame):
+    return json.loads(frame.to_json(orient="records"))
+
+
+def _encode(results):
+    return json.dumps(results).encode()
+
+
+def _error(status, message):
+    return status, _encode({"error": message})
+
+
+async def handle_connection(service, reader, writer):
+    """
+    Serves the HTTP/1.1 requests of one connection, keeping it open
+    between requests unless the client asks to close it.
+    """
+    try:
+        while True:
+            try:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                method, target, version = (
+                    request_line.decode("latin-1").split()
+                )
+                length = int(headers.get("content-length", 0))
+                if length < 0:
+                    raise ValueError("negative content length")
+            except (ValueError, asyncio.LimitOverrunError):
+                # readline raises ValueError for a line over the limit
+                _respond(writer, *_error(400, "malformed request"), False)
+                break
+            if length > MAX_BODY:
+                _respond(writer, *_error(413, "the body is too large"), False)
+                break
+            body = await reader.readexactly(length) if length else b""
+            status, payload = await service.handle(method, target, body)
+            connection = headers.get("connection", "").lower()
+            keep_alive = (
+                connection == "keep-alive"
+                or version == "HTTP/1.1" and connection != "close"
+            )
+            _respond(writer, status, payload, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+def _respond(writer, status, payload, keep_alive):
+    writer.write(
+        (
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n"
+        ).encode("latin-1")
+        + payload
+    )
+
+
+async def serve(host=HOST, port=PORT, service=None):
+    """Serves the API until the task is cancelled."""
+    service = service or ApiService()
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_connection(service, reader, writer),
+        host,
+        port,
+    )
+    print(f"Serving the InvestIQ API on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve the InvestIQ ranking and portfolios as JSON."
+    )
+    parser.add_argument(
+        "--host", default=HOST, help="the address to listen on"
+    )
+    parser.add_argument(
+        "--port", type=int, default=PORT, help="the port to listen on"
+    )
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
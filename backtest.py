@@ -0,0 +1,245 @@
+"""
+Walk-forward backtest of the InvestIQ strategy: rank the companies
+on their fundamentals, keep the top ranked ones and weight them with
+Hierarchical Risk Parity (HRP), rebalancing on a fixed schedule.
+
+The backtest runs offline from local data: a price panel, as a csv
+file or a price store (see price_store.py), and a point-in-time
+fundamentals history (see `load_prices` and `load_fundamentals`).
+
+Usage:
+    python backtest.py --prices prices.csv \
+        --fundamentals fundamentals.csv --size 10 --output equity.csv
+"""
+import argparse
+import collections
+import os
+
+import numpy as np
+import pandas as pd
+
+from optimizer import RiskModel
+from price_store import PriceStore
+from ranking import FACTOR_WEIGHTS, percentile_rank, score_stocks
+
+# Trading days in a quarter, the window of the quarterlyReturn factor
+QUARTER_DAYS = 63
+# Trading days of prices the HRP risk model is estimated from
+LOOKBACK_DAYS = 252
+
+BacktestResult = collections.namedtuple(
+    "BacktestResult", ["equity", "weights", "holdings", "turnover"]
+)
+
+
+def load_prices(path):
+    """
+    Reads a price panel from a csv file with a 'Date' column and one
+    column of adjusted close prices per ticker, or from the directory
+    of a price store, which is memory-mapped rather than read.
+    """
+    if os.path.isdir(path):
+        return PriceStore(path).panel()
+    return pd.read_csv(path, index_col="Date", parse_dates=True).sort_index()
+
+
+def load_fundamentals(path):
+    """
+    Reads a point-in-time fundamentals history from a csv file with
+    a 'date' column, the date the values became known, a 'symbol'
+    column and one column per fundamental.
+    """
+    return pd.read_csv(path, parse_dates=["date"])
+
+
+def run_backtest(
+    prices,
+    fundamentals,
+    size=10,
+    frequency="Q",
+    lookback=LOOKBACK_DAYS,
+    weights=FACTOR_WEIGHTS,
+    cost=0.0,
+):
+    """
+    Replays the ranking and HRP optimization at every rebalance date
+    and simulates holding the resulting portfolios.
+
+    At each rebalance date the latest fundamentals known on that date
+    are ranked together with each company's return over the previous
+    quarter, and the `size` highest scoring companies with a full
+    `lookback` window of prices are weighted with HRP. Between
+    rebalances the shares are held, so the weights drift with prices.
+    The holdings, turnover and equity curve of every day are computed
+    with array operations over the whole price panel rather than a
+    loop over days.
+
+    Args:
+        prices (pd.DataFrame): A price panel indexed by trading date
+        with one column per ticker.
+        fundamentals (pd.DataFrame): The fundamentals history, with
+        'date' and 'symbol' columns and one column per fundamental.
+        size (int, optional): The number of companies held.
+        frequency (str, optional): The pandas frequency of the
+        rebalance schedule, quarterly by default.
+        lookback (int, optional): The number of trading days of prices
+        the HRP risk model is estimated from.
+        weights (dict, optional): The factor weights used to score the
+        companies. Defaults to `FACTOR_WEIGHTS`.
+        cost (float, optional): The trading cost as a fraction of the
+        value traded.
+
+    Returns:
+        BacktestResult: A named tuple of
+        equity (pd.Series): The portfolio value on each day, starting
+        from 1.
+        weights (pd.DataFrame): The target weights set at each
+        rebalance date.
+        holdings (pd.DataFrame): The weight of each ticker held at the
+        close of each day, before that day's rebalance.
+        turnover (pd.Series): The fraction of the portfolio traded at
+        each rebalance date.
+
+    Raises:
+        ValueError: If the portfolio size is below 2, the fewest
+        companies HRP can weight.
+    """
+    if size < 2:
+        raise ValueError("the portfolio size must be at least 2")
+    prices = prices.sort_index().ffill()
+    dates = prices.index
+    rebalance_dates = rebalance_schedule(dates, frequency, lookback)
+
+    targets = pd.DataFrame(0.0, index=rebalance_dates, columns=prices.columns)
+    factors = point_in_time_factors(prices, fundamentals, rebalance_dates)
+    for rebalance_date, table in factors.groupby("date"):
+        window = prices.loc[:rebalance_date].tail(lookback + 1)
+        complete = window.columns[window.notna().all()]
+        ranked = table[table["symbol"].isin(complete)]
+        ranked = ranked.set_index("symbol")[list(weights)].dropna()
+        if len(ranked) < 2:
+            continue
+        scores = score_stocks(percentile_rank(ranked), weights)
+        chosen = scores.sort_values(ascending=False, kind="stable")
+        hrp_weights = RiskModel(window[chosen.index[:size]]).hrp()
+        targets.loc[rebalance_date, list(hrp_weights)] = list(
+            hrp_weights.values()
+        )
+
+    # Each day belongs to the segment of the last rebalance before it,
+    # so a rebalance day still closes with the previous holdings
+    positions = dates.get_indexer(rebalance_dates)
+    segment = np.searchsorted(positions, np.arange(len(dates))) - 1
+    invested = segment >= 0
+    target = targets.to_numpy()
+    cash = 1 - target.sum(axis=1)
+
+    # Shares are held between rebalances, so each position's value
+    # grows with its price relative to the segment's rebalance price
+    price = prices.to_numpy()
+    relative = price[invested] / price[positions[segment[invested]]]
+    value = np.where(
+        target[segment[invested]] > 0,
+        target[segment[invested]] * relative,
+        0.0,
+    )
+    growth = np.ones(len(dates))
+    growth[invested] = value.sum(axis=1) + cash[segment[invested]]
+    held = np.zeros(price.shape)
+    held[invested] = value / growth[invested, None]
+
+    # Half the weight traded, counting cash as a position, so that
+    # buying the first portfolio from cash is a turnover of 1
+    before = held[positions]
+    turnover = 0.5 * (
+        np.abs(target - before).sum(axis=1)
+        + np.abs(cash - (1 - before.sum(axis=1)))
+    )
+
+    # The value after each rebalance compounds the growth of the
+    # previous segment and the cost of trading
+    after_trade = np.cumprod(
+        np.r_[1.0, growth[positions[1:]]] * (1 - cost * turnover)
+    )
+    equity = np.ones(len(dates))
+    equity[invested] = after_trade[segment[invested]] * growth[invested]
+
+    return BacktestResult(
+        pd.Series(equity, index=dates, name="equity"),
+        targets,
+        pd.DataFrame(held, index=dates, columns=prices.columns),
+        pd.Series(turnover, index=rebalance_dates, name="turnover"),
+    )
+
+
+def rebalance_schedule(dates, frequency, lookback):
+    """
+    Returns the last trading day of each period of `frequency` that
+    has at least `lookback` earlier trading days, leaving out the
+    last trading day of the panel.
+    """
+    positions = pd.Series(np.arange(len(dates)), index=dates)
+    ends = positions.resample(frequency).last().dropna().astype(int)
+    ends = ends[(ends >= lookback) & (ends < len(dates) - 1)]
+    return dates[ends.to_numpy()]
+
+
+def point_in_time_factors(prices, fundamentals, rebalance_dates):
+    """
+    Returns the factors of every company at every rebalance date:
+    the latest fundamentals known on the date, and the company's
+    return over the previous quarter.
+
+    Returns:
+        pd.DataFrame: A DataFrame with 'date' and 'symbol' columns and
+        one column per factor, with a row per rebalance date and
+        company.
+    """
+    quarterly_return = prices.pct_change(QUARTER_DAYS).loc[rebalance_dates]
+    grid = quarterly_return.stack(dropna=False).rename("quarterlyReturn")
+    grid = grid.rename_axis(["date", "symbol"]).reset_index()
+    known = fundamentals.drop(columns="quarterlyReturn", errors="ignore")
+    return pd.merge_asof(
+        grid.sort_values("date"),
+        known.sort_values("date"),
+        on="date",
+        by="symbol",
+    )
+
+
+def main():
+    """
+    Parses the command line arguments, runs the backtest and writes
+    the equity curve, and prints the total return and turnover.
+    """
+    parser = argparse.ArgumentParser(
+        description="Backtest the InvestIQ strategy on local data."
+    )
+    parser.add_argument("--prices", required=True,
+                        help="csv file or store of the price panel")
+    parser.add_argument("--fundamentals", required=True,
+                        help="csv file of the fundamentals history")
+    parser.add_argument("--size", type=int, default=10,
+                        help="the number of companies held")
+    parser.add_argument("--frequency", default="Q",
+                        help="the pandas frequency of the rebalances")
+    parser.add_argument("--cost", type=float, default=0.0,
+                        help="the trading cost as a fraction of value")
+    parser.add_argument("--output", required=True,
+                        help="the csv file to write the equity curve to")
+    args = parser.parse_args()
+
+    result = run_backtest(
+        load_prices(args.prices),
+        load_fundamentals(args.fundamentals),
+        size=args.size,
+        frequency=args.frequency,
+        cost=args.cost,
+    )
+    result.equity.to_csv(args.output, index_label="Date")
+    print("Total return: {:.1%}".format(result.equity.iloc[-1] - 1))
+    print("Average turnover: {:.1%}".format(result.turnover.mean()))
+
+
+if __name__ == "__main__":
+    main()
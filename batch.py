@@ -0,0 +1,292 @@
+"""
+Runs the four InvestIQ steps without any prompts or typewriter
+delays and writes the results to a JSON file.
+
+Each stage's result is kept in a content-addressed stage cache (see
+stage_cache.py), so running the pipeline again only recomputes the
+stages whose inputs have changed. The constituents, fundamentals and
+prices are keyed by the day, so they are collected again each day.
+
+Usage:
+    python batch.py --universe dow --size 10 --budget 10000 \
+        --output portfolio.json [--allocation rounding] [--sweep] \
+        [--no-cache]
+"""
+import argparse
+import json
+import time
+
+import pandas as pd
+
+import tracing
+from allocation import BUDGETS, METHODS, budget_sweep
+from optimizer import FREQUENCY, RiskModel
+from risk_model import OnlineRiskModel, update_state
+from stage_cache import StageCache
+from utils import (
+    INDEX_URLS,
+    allocate_shares,
+    collect_data,
+    download_price_panel,
+    price_window,
+    process_data,
+    rank_companies,
+    scrape_company_tickers,
+)
+
+
+def run_batch(
+    universe,
+    size,
+    budget,
+    allocation="greedy",
+    sweep=False,
+    risk_state=None,
+    cache=None,
+):
+    """
+    Runs the full pipeline for one stock index, portfolio size
+    and budget.
+
+    Step 1 collects the index's companies and fundamentals, Step 2
+    ranks them, Step 3 optimizes the portfolio of the `size` highest
+    ranked companies with HRP and Step 4 allocates the budget into
+    shares. The time spent in each step is recorded, so the real
+    compute time of the pipeline can be measured.
+
+    Args:
+        universe (str): The stock index to use, one of the keys
+        of `INDEX_URLS`.
+        size (int): The number of top ranked companies to include
+        in the portfolio.
+        budget (float): The total amount to invest.
+        allocation (str, optional): The allocation method, one of
+        the allocation module's `METHODS`.
+        sweep (bool, optional): Whether to also allocate the portfolio
+        for every budget in the allocation module's `BUDGETS` and
+        report the funds remaining and tracking error of each.
+        risk_state (str, optional): The path of the saved estimates
+        of an `OnlineCovariance` of the index. When given, the
+        estimates are brought up to date with the new days of prices
+        and used for the optimization, instead of recomputing the
+        risk model from the whole price window, unless a stock of the
+        portfolio was listed within the window and is not in them.
+        cache (StageCache, optional): The cache of the stages' results.
+        Every stage is computed when not given.
+
+    Returns:
+        dict: The ranking table, portfolio weights, share allocation,
+        funds remaining, performance metrics, budget sweep (None
+        unless `sweep` is true), step timings and stage cache counts
+        (None without a cache), in a form that can be written out as
+        JSON.
+
+    Raises:
+        ValueError: If the portfolio size is below 3 or above the
+        number of ranked companies, or the budget is not positive.
+    """
+    from pypfopt.discrete_allocation import get_latest_prices
+
+    if budget <= 0:
+        raise ValueError("the budget must be greater than 0")
+    run = cache.run if cache else _run
+    timings = {}
+    start, end = price_window()
+    start = pd.Timestamp(start).normalize()
+    as_of = pd.Timestamp(end).normalize()
+
+    started = time.perf_counter()
+    symbols = run("constituents", _constituents, INDEX_URLS[universe], as_of)
+    fundamentals_data, symbols = run(
+        "fundamentals", _fundamentals, symbols, as_of
+    )
+    price_panel = run(
+        "price_panel",
+        download_price_panel,
+        fundamentals_data["symbol"],
+        start,
+        as_of,
+    )
+    timings["collect"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    fundamentals_data = run(
+        "quarterly_returns",
+        _quarterly_returns,
+        fundamentals_data,
+        price_panel,
+        as_of,
+    )
+    ranking, removed_companies = run(
+        "ranking", rank_companies, fundamentals_data
+    )
+    timings["rank"] = time.perf_counter() - started
+
+    if size < 3 or size > len(ranking):
+        raise ValueError(
+            f"the portfolio size must be between 3 and {len(ranking)}"
+        )
+
+    started = time.perf_counter()
+    portfolio_stocks = ranking["symbols"].head(size).tolist()
+    portfolio_prices = price_panel[portfolio_stocks]
+    estimator = update_state(risk_state, price_panel) if risk_state else None
+    if estimator and set(portfolio_stocks) <= set(estimator.tickers):
+        risk_model = OnlineRiskModel(estimator, portfolio_stocks)
+        weights = risk_model.hrp()
+        performance = risk_model.performance(weights)
+    else:
+        risk_model = RiskModel(portfolio_prices)
+        weights, performance = run("hrp", _hrp, portfolio_prices)
+    timings["optimize"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    latest_prices = get_latest_prices(portfolio_prices)
+    shares, leftover = run(
+        "allocation",
+        allocate_shares,
+        weights,
+        latest_prices,
+        budget,
+        allocation,
+    )
+    timings["allocate"] = time.perf_counter() - started
+
+    sweep_results = None
+    if sweep:
+        started = time.perf_counter()
+        sweep_results, _ = run(
+            "budget_sweep",
+            budget_sweep,
+            weights,
+            latest_prices,
+            risk_model.sample_cov * FREQUENCY,
+            BUDGETS,
+            allocation,
+        )
+        timings["sweep"] = time.perf_counter() - started
+
+    expected_return, volatility, sharpe = performance
+    return {
+        "universe": universe,
+        "size": size,
+        "budget": budget,
+        "removed_companies": int(removed_companies),
+        "ranking": json.loads(ranking.to_json(orient="records")),
+        "weights": {
+            ticker: float(weight) for ticker, weight in weights.items()
+        },
+        "allocation": {
+            ticker: int(count) for ticker, count in shares.items()
+        },
+        "leftover": float(leftover),
+        "performance": {
+            "expected_annual_return": float(expected_return),
+            "annual_volatility": float(volatility),
+            "sharpe_ratio": float(sharpe),
+        },
+        "budget_sweep": None if sweep_results is None else json.loads(
+            sweep_results.reset_index().to_json(orient="records")
+        ),
+        "timings": timings,
+        "cache": None if cache is None else json.loads(
+            cache.stats().to_json(orient="index")
+        ),
+    }
+
+
+def _run(stage, function, *args):
+    return function(*args)
+
+
+# The stages below take the day they are run as an argument, which is
+# only part of the stage cache's key, so that the data collected from
+# the network is reused for the rest of the day and collected again
+# the next day.
+
+def _constituents(url, as_of):
+    return scrape_company_tickers(url)
+
+
+def _fundamentals(symbols, as_of):
+    return collect_data(symbols)
+
+
+def _quarterly_returns(fundamentals_data, price_panel, as_of):
+    return fundamentals_data.assign(
+        quarterlyReturn=process_data(
+            fundamentals_data["symbol"], end=as_of, prices=price_panel
+        )
+    )
+
+
+def _hrp(prices):
+    risk_model = RiskModel(prices)
+    weights = risk_model.hrp()
+    return weights, risk_model.performance(weights)
+
+
+def main():
+    """
+    Parses the command line arguments, runs the pipeline and
+    writes its results to the output file.
+    """
+    parser = argparse.ArgumentParser(
+        description="Run the InvestIQ pipeline without prompts."
+    )
+    parser.add_argument(
+        "--universe", choices=sorted(INDEX_URLS), default="dow",
+        help="the stock index to build the portfolio from",
+    )
+    parser.add_argument(
+        "--size", type=int, required=True,
+        help="the number of top ranked companies in the portfolio",
+    )
+    parser.add_argument(
+        "--budget", type=float, required=True,
+        help="the total amount to invest",
+    )
+    parser.add_argument(
+        "--allocation", choices=METHODS, default="greedy",
+        help="the method used to convert the weights into shares",
+    )
+    parser.add_argument(
+        "--sweep", action="store_true",
+        help="also allocate every budget from $1,000 to $10,000,000",
+    )
+    parser.add_argument(
+        "--risk-state",
+        help="a file of risk model estimates to update and reuse",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="compute every stage instead of reusing cached results",
+    )
+    parser.add_argument(
+        "--output", required=True,
+        help="the path of the JSON file to write the results to",
+    )
+    args = parser.parse_args()
+
+    try:
+        with tracing.span("batch", universe=args.universe, size=args.size):
+            results = run_batch(
+                args.universe,
+                args.size,
+                args.budget,
+                args.allocation,
+                args.sweep,
+                args.risk_state,
+                None if args.no_cache else StageCache(),
+            )
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        tracing.write()
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Import-time budget check for the program's cold start.
+
+Each module is imported in a fresh interpreter several times and the
+fastest run is compared with the budget, so the check is not thrown
+off by a single slow run. The slowest imports reported by
+`python -X importtime` are listed to show where the time goes. The
+script exits with status 1 when a module is over budget, so it can be
+used as a CI gate.
+
+Usage (from the project root):
+    python -m benchmarks.import_time [--budget SECONDS] [module ...]
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+# The modules a terminal session imports before showing any output
+MODULES = ["run", "batch"]
+# The default budget in seconds for importing one module
+BUDGET = 1.0
+RUNS = 5
+
+
+def import_time(module, runs=RUNS):
+    """
+    Returns the fastest wall-clock time, in seconds, of importing
+    `module` in a fresh interpreter.
+    """
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], check=True)
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def slowest_imports(module, count=5):
+    """
+    Returns the `count` top-level packages with the highest
+    cumulative import time, in seconds, when importing `module`.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    packages = {}
+    for line in result.stderr.splitlines()[1:]:
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        if "." in name or name == module:
+            continue
+        packages[name] = max(packages.get(name, 0), int(cumulative) / 1e6)
+    return sorted(
+        packages.items(), key=lambda item: item[1], reverse=True
+    )[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--budget", type=float, default=BUDGET)
+    args = parser.parse_args()
+
+    over_budget = False
+    for module in args.modules:
+        seconds = import_time(module)
+        status = "ok" if seconds <= args.budget else "OVER BUDGET"
+        print(f"{module}: {seconds:.3f}s (budget {args.budget:.3f}s) {status}")
+        for name, cumulative in slowest_imports(module):
+            print(f"    {cumulative:.3f}s {name}")
+        over_budget = over_budget or seconds > args.budget
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark of the vectorized percentile rank engine against the
+original per-value scipy implementation.
+
+For each universe size a seeded random fundamentals table is ranked
+by both implementations. The script stops with an error if the two
+results differ, then prints the time each one took.
+
+Usage (from the project root):
+    python -m benchmarks.percentile_rank [size ...]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import scipy.stats as stats
+
+from ranking import FACTORS, INVERSE_FACTORS, percentile_rank
+
+SIZES = [30, 500, 5000]
+
+
+def legacy_percentile_rank(df):
+    """
+    The original `calculate_percentile_rank`, which calls
+    percentileofscore once for every value in the DataFrame.
+    """
+    ranked_percentiles = df.apply(
+        lambda x: [
+            stats.percentileofscore(x, a, "rank") if pd.notnull(a) else np.nan
+            for a in x
+        ]
+    )
+    for column in INVERSE_FACTORS:
+        if column in ranked_percentiles:
+            ranked_percentiles[column] = 100 - ranked_percentiles[column]
+    return ranked_percentiles.round(2)
+
+
+def make_fundamentals(size, seed=0):
+    """
+    Builds a seeded random fundamentals table with some repeated
+    values, so that tied ranks are exercised as well.
+    """
+    rng = np.random.default_rng(seed)
+    values = rng.normal(size=(size, len(FACTORS))).round(1)
+    symbols = [f"T{i}" for i in range(size)]
+    return pd.DataFrame(values, columns=FACTORS, index=symbols)
+
+
+def timed(function, df):
+    started = time.perf_counter()
+    result = function(df)
+    return result, time.perf_counter() - started
+
+
+def main(sizes):
+    print(f"{'tickers':>8} {'legacy (s)':>12} {'vectorized (s)':>15}")
+    for size in sizes:
+        df = make_fundamentals(size)
+        expected, legacy_time = timed(legacy_percentile_rank, df)
+        result, vectorized_time = timed(percentile_rank, df)
+        pd.testing.assert_frame_equal(result, expected)
+        print(f"{size:>8} {legacy_time:>12.4f} {vectorized_time:>15.4f}")
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or SIZES)
@@ -0,0 +1,217 @@
+"""
+Benchmark of every stage of the pipeline at the size of the Dow, the
+S&P 500 and a 5,000 company universe.
+
+All the data is synthetic and seeded, so the benchmark needs no
+network and every run measures the same work. Each stage is timed
+several times and the fastest run is kept, then run once more under
+tracemalloc to measure its peak memory. The results are saved under
+benchmarks/results/ named after the current git commit, and can be
+compared with the results of an earlier commit to spot regressions.
+
+Usage (from the project root):
+    python -m benchmarks.pipeline [--sizes 30 500 5000]
+        [--compare COMMIT] [--threshold 1.2]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.percentile_rank import make_fundamentals
+from fundamentals_table import FundamentalsTable, rank_table
+from momentum import horizon_returns
+from price_cache import cached_price_panel
+from ranking import percentile_rank
+from utils import rank_companies, rank_stocks
+
+SIZES = [30, 500, 5000]
+# Trading days of synthetic prices, a year as in the program
+DAYS = 252
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+# The slowdown relative to the compared commit reported as a regression
+THRESHOLD = 1.2
+INVESTMENT = 1_000_000
+
+
+def make_prices(size, days=DAYS, seed=0, end="2023-09-29"):
+    """
+    Builds seeded random adjusted close prices for `size` tickers,
+    driven by a few common factors so that the stocks are correlated
+    and form clusters, as real stocks do.
+    """
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(0, 0.01, size=(days, 5))
+    loadings = rng.uniform(0, 1, size=(5, size))
+    returns = factors @ loadings + rng.normal(0.0005, 0.01, (days, size))
+    return pd.DataFrame(
+        100 * np.exp(np.cumsum(returns, axis=0)),
+        index=pd.bdate_range(end=end, periods=days),
+        columns=[f"T{i}" for i in range(size)],
+    )
+
+
+def stages(size, cache_dir):
+    """
+    Returns the stages to benchmark for a universe of `size` tickers,
+    each as a function taking no arguments, with the synthetic data
+    they work on already built. The price cache is kept in
+    `cache_dir`.
+    """
+    from pypfopt import HRPOpt
+    from pypfopt.discrete_allocation import DiscreteAllocation
+
+    fundamentals = make_fundamentals(size)
+    percentiles = percentile_rank(fundamentals)
+    fundamentals_data = fundamentals.rename_axis("symbol").reset_index()
+    table = FundamentalsTable.from_frame(fundamentals_data)
+    prices = make_prices(size)
+    tickers = list(prices.columns)
+    weights = HRPOpt(prices.pct_change().dropna()).optimize()
+    start, end = prices.index[0], prices.index[-1] + pd.Timedelta(days=1)
+
+    def fetch(group, fetch_start, fetch_end):
+        return prices.loc[fetch_start:fetch_end, group]
+
+    # Fill the cache, so that panel assembly measures a repeat run
+    cached_price_panel(tickers, start, end, fetch, cache_dir)
+
+    return {
+        "percentile_rank": lambda: percentile_rank(fundamentals),
+        "rank_stocks": lambda: rank_stocks(percentiles.copy()),
+        "rank_companies": lambda: rank_companies(fundamentals_data),
+        "rank_table": lambda: rank_table(table),
+        "quarterly_returns": lambda: horizon_returns(prices),
+        "price_panel": lambda: cached_price_panel(
+            tickers, start, end, fetch, cache_dir
+        ),
+        "hrp_optimize": lambda: HRPOpt(
+            prices.pct_change().dropna()
+        ).optimize(),
+        "greedy_portfolio": lambda: DiscreteAllocation(
+            weights, prices.iloc[-1], total_portfolio_value=INVESTMENT
+        ).greedy_portfolio(),
+    }
+
+
+def measure(function, repeat):
+    """
+    Returns the fastest of `repeat` runs of `function` in seconds, and
+    the peak memory in bytes that it allocated in one more run.
+    """
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), peak
+
+
+def run(sizes, repeat=3):
+    """
+    Benchmarks every stage at every size.
+
+    Returns:
+        dict: The seconds and peak bytes of each stage, keyed by
+        size and then stage name.
+    """
+    results = {}
+    for size in sizes:
+        # Large universes take seconds per run, so are run fewer times
+        runs = repeat if size <= 500 else 1
+        results[str(size)] = {}
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for name, function in stages(size, cache_dir).items():
+                seconds, peak = measure(function, runs)
+                results[str(size)][name] = {
+                    "seconds": seconds, "peak": peak
+                }
+                print(
+                    f"{size:>6} {name:<18} {seconds:>10.4f}s"
+                    f" {peak / 2 ** 20:>10.1f} MiB"
+                )
+    return results
+
+
+def current_commit():
+    """
+    Returns the short hash of the current git commit, with a '+dirty'
+    suffix when the working tree has changes.
+    """
+    commit = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        capture_output=True, text=True, check=True,
+    ).stdout.strip()
+    dirty = subprocess.run(
+        ["git", "status", "--porcelain", "--untracked-files=no"],
+        capture_output=True, text=True, check=True,
+    ).stdout.strip()
+    return commit + ("+dirty" if dirty else "")
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the time of every stage relative to a baseline and returns
+    whether any stage is slower than `threshold` times the baseline.
+    """
+    regressed = False
+    for size, timings in results.items():
+        for name, result in timings.items():
+            before = baseline.get(size, {}).get(name)
+            if before is None:
+                continue
+            ratio = result["seconds"] / before["seconds"]
+            status = "REGRESSION" if ratio > threshold else ""
+            print(f"{size:>6} {name:<18} {ratio:>8.2f}x {status}")
+            regressed = regressed or ratio > threshold
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--compare", metavar="COMMIT",
+                        help="the commit whose results to compare with")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    commit = current_commit()
+    results = run(args.sizes, args.repeat)
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, commit + ".json"), "w") as f:
+        json.dump(
+            {
+                "commit": commit,
+                "python": sys.version.split()[0],
+                "numpy": np.__version__,
+                "pandas": pd.__version__,
+                "results": results,
+            },
+            f,
+            indent=1,
+        )
+    print(f"Saved the results of {commit}")
+
+    if args.compare:
+        with open(os.path.join(RESULTS_DIR, args.compare + ".json")) as f:
+            baseline = json.load(f)["results"]
+        print(f"Compared with {args.compare}:")
+        sys.exit(1 if compare(results, baseline, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import json
+import os
+import time
+
+import pandas as pd
+
+from price_cache import atomic_write
+from tracing import traced
+
+# The Wikipedia pages listing the companies in each stock index
+INDEX_URLS = {
+    "dow": "https://en.wikipedia.org/wiki/Dow_Jones_Industrial_Average",
+    "sp100": "https://en.wikipedia.org/wiki/S%26P_100",
+    "sp500": "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies",
+}
+# Directory of the cached constituent lists
+CACHE_DIR = os.environ.get(
+    "INVESTIQ_CONSTITUENTS_CACHE", "constituents_cache"
+)
+# How long, in seconds, a cached constituent list is used before it
+# is scraped again. Index membership only changes a few times a year.
+TTL = float(os.environ.get("INVESTIQ_CONSTITUENTS_TTL", 7 * 24 * 3600))
+# Constituent lists shipped with the program, used when Wikipedia
+# cannot be reached and nothing is cached yet
+SNAPSHOT_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "constituents_snapshot.json"
+)
+
+
+def get_constituents(index, ttl=TTL, cache_dir=CACHE_DIR):
+    """
+    Returns the ticker symbols of the companies in a stock index,
+    scraping Wikipedia only when the cached list is out of date.
+
+    A list younger than `ttl` seconds is served from the cache.
+    Otherwise the index's Wikipedia page is scraped again and the
+    cache is refreshed. If scraping fails, the out of date cached
+    list is used, or the bundled snapshot if nothing is cached.
+
+    Args:
+        index (str): The index, one of the keys of `INDEX_URLS`.
+        ttl (float, optional): The age in seconds after which the
+        cached list is scraped again.
+        cache_dir (str, optional): The directory of the cache.
+
+    Returns:
+        pd.Series: The ticker symbols of the companies in the index.
+
+    Raises:
+        KeyError: If the index is unknown.
+        RuntimeError: If the index could not be scraped and has
+        neither a cached list nor a snapshot, from the scraping error.
+    """
+    url = INDEX_URLS[index]
+    path = os.path.join(cache_dir, index + ".json")
+    cached = _read_json(path)
+    if cached and time.time() - cached["fetched"] < ttl:
+        return pd.Series(cached["symbols"], name="Symbol")
+
+    try:
+        symbols = scrape_constituents(url)
+    except Exception as e:
+        if cached is None:
+            cached = (_read_json(SNAPSHOT_FILE) or {}).get(index)
+        if cached is None:
+            raise RuntimeError(
+                f"failed to scrape the {index} companies and there is no"
+                f" saved list of them: {e}"
+            ) from e
+        print(
+            f"Failed to scrape the {index} companies. Error: {e} -\
+ using the saved list instead."
+        )
+        return pd.Series(cached["symbols"], name="Symbol")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    atomic_write(
+        path,
+        lambda f: json.dump(
+            {"fetched": time.time(), "symbols": symbols.tolist()}, f
+        ),
+    )
+    return symbols
+
+
+@traced
+def scrape_constituents(url):
+    """
+    Scrapes the ticker symbols from the constituents table of an
+    index's Wikipedia page.
+
+    Only the table with the id 'constituents' is parsed, rather than
+    every table on the page. Pages without such a table fall back
+    to the first table with a 'Symbol' column.
+
+    Args:
+        url (str): The URL of the Wikipedia page of the index.
+
+    Returns:
+        pd.Series: The ticker symbols in the table.
+    """
+    try:
+        tables = pd.read_html(url, attrs={"id": "constituents"})
+    except ValueError:
+        tables = pd.read_html(url, match="Symbol")
+    table = next(table for table in tables if "Symbol" in table)
+    return table["Symbol"].rename("Symbol")
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
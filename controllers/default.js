@@ -1,44 +1,117 @@
 const Pty = require('node-pty');
 const fs = require('fs');
+const net = require('net');
+const { spawn } = require('child_process');
+
+// Unix socket of the pre-warmed Python session server
+const SESSION_SOCKET = process.env.INVESTIQ_SESSION_SOCKET || '/tmp/investiq-session.sock';
 
 exports.install = function () {
 
     ROUTE('/');
     WEBSOCKET('/', socket, ['raw']);
 
+    // Start the session server, which imports the program once and
+    // forks a ready-to-run session for every connection
+    const server = spawn('python3', ['session_server.py', SESSION_SOCKET], {
+        cwd: process.env.PWD,
+        env: process.env,
+        stdio: 'inherit'
+    });
+
+    server.on('exit', function (code, signal) {
+        console.log("Session server stopped", code, signal);
+    });
+
+    // Start the refresher, which keeps the data of the indices the
+    // terminal offers up to date so that sessions never wait for
+    // downloads. Only the Dow is offered, so the other indices, with
+    // hundreds of rate-limited downloads, are not refreshed.
+    const indices = (process.env.INVESTIQ_REFRESH_INDICES || 'dow').split(/[\s,]+/).filter(Boolean);
+    const refresher = spawn('python3', ['refresher.py'].concat(indices), {
+        cwd: process.env.PWD,
+        env: process.env,
+        stdio: 'inherit'
+    });
+
+    refresher.on('exit', function (code, signal) {
+        console.log("Refresher stopped", code, signal);
+    });
+
 };
 
-function socket() {
+// Spawn a fresh python process for the session, used when the
+// session server is not available
+function spawnTerminal(client) {
 
-    this.encodedecode = false;
-    this.autodestroy();
+    client.tty = Pty.spawn('python3', ['run.py'], {
+        name: 'xterm-color',
+        cols: 80,
+        rows: 24,
+        cwd: process.env.PWD,
+        env: process.env
+    });
 
-    this.on('open', function (client) {
+    client.tty.on('exit', function (code, signal) {
+        client.tty = null;
+        client.close();
+        console.log("Process killed");
+    });
+
+    client.tty.on('data', function (data) {
+        client.send(data);
+    });
+
+    client.tty.destroy = function () {
+        this.kill(9);
+    };
+}
 
-        // Spawn terminal
-        client.tty = Pty.spawn('python3', ['run.py'], {
-            name: 'xterm-color',
-            cols: 80,
-            rows: 24,
-            cwd: process.env.PWD,
-            env: process.env
-        });
+// Hand the session to the pre-warmed session server
+function connectSession(client) {
 
-        client.tty.on('exit', function (code, signal) {
+    const conn = net.createConnection(SESSION_SOCKET);
+    let connected = false;
+
+    conn.setEncoding('utf8');
+
+    conn.on('connect', function () {
+        connected = true;
+        client.tty = conn;
+    });
+
+    conn.on('data', function (data) {
+        client.send(data);
+    });
+
+    conn.on('error', function (err) {
+        if (!connected) {
+            console.log("Session server unavailable, spawning terminal");
+            spawnTerminal(client);
+        }
+    });
+
+    conn.on('close', function () {
+        if (connected && client.tty === conn) {
             client.tty = null;
             client.close();
-            console.log("Process killed");
-        });
+            console.log("Session closed");
+        }
+    });
+}
 
-        client.tty.on('data', function (data) {
-            client.send(data);
-        });
+function socket() {
 
+    this.encodedecode = false;
+    this.autodestroy();
+
+    this.on('open', function (client) {
+        connectSession(client);
     });
 
     this.on('close', function (client) {
         if (client.tty) {
-            client.tty.kill(9);
+            client.tty.destroy();
             client.tty = null;
             console.log("Process killed and terminal unloaded");
         }
@@ -57,4 +130,4 @@ if (process.env.CREDS != null) {
             socket.emit("console_output", "Error saving credentials: " + err);
         }
     });
-}
\ No newline at end of file
+}
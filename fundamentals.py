@@ -0,0 +1,163 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import tracing
+
+# The fundamentals collected for each company, in the column order
+# of fundamentals_data_dow.csv
+FUNDAMENTALS = [
+    "marketCap",
+    "forwardPE",
+    "priceToBook",
+    "forwardEps",
+    "debtToEquity",
+    "returnOnEquity",
+    "returnOnAssets",
+    "revenueGrowth",
+    "quickRatio",
+    "dividendYield",
+]
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that limits how often requests
+    are made.
+
+    Tokens are added at `rate` per second up to `capacity`, and
+    every request takes one token, waiting for it if the bucket is
+    empty. This allows short bursts while keeping the average rate
+    of requests at `rate` per second.
+
+    Args:
+        rate (float): The number of requests allowed per second.
+        capacity (float, optional): The largest burst of requests.
+        Defaults to `rate`.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Takes one token from the bucket, waiting until one is
+        available.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate,
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def yfinance_provider(symbol):
+    """
+    Fetches the information yfinance holds for a company.
+
+    Args:
+        symbol (str): The ticker symbol of the company. Share class
+        dots, as in 'BRK.B', are converted to yfinance's dashes.
+
+    Returns:
+        dict: The company information, keyed by field name.
+    """
+    import yfinance as yf
+
+    return yf.Ticker(symbol.replace(".", "-")).info
+
+
+def fetch_fundamentals(
+    symbols,
+    provider=yfinance_provider,
+    max_workers=8,
+    rate=5.0,
+    retries=2,
+    backoff=0.5,
+    max_failures=10,
+):
+    """
+    Fetches the fundamentals of many companies concurrently.
+
+    The companies are fetched from a pool of `max_workers` threads
+    that share a token bucket, so no more than `rate` requests are
+    made per second. A failed request is retried up to `retries`
+    times, waiting `backoff` seconds and then twice as long on each
+    later retry. Once `max_failures` companies have failed, which
+    usually means the provider is rate limiting or unreachable, the
+    companies still waiting are skipped rather than fetched.
+
+    Fields that the provider does not return are left as NaN, as
+    for any other missing data; only companies that could not be
+    fetched at all are reported as failures.
+
+    Args:
+        symbols (list): The ticker symbols of the companies.
+        provider (callable, optional): A function taking a ticker
+        symbol and returning a dict of the company's fields.
+        Defaults to `yfinance_provider`.
+        max_workers (int, optional): The number of threads.
+        rate (float, optional): The number of requests per second.
+        retries (int, optional): The number of retries per company.
+        backoff (float, optional): The wait in seconds before the
+        first retry.
+        max_failures (int, optional): The number of failed companies
+        after which the remaining ones are skipped.
+
+    Returns:
+        pd.DataFrame: A DataFrame with a 'symbol' column and one
+        column per fundamental, with one row per fetched company in
+        the order of `symbols`.
+        dict: The error message of each company that failed.
+    """
+    bucket = TokenBucket(rate)
+    failures = {}
+    failures_lock = threading.Lock()
+
+    def fetch(symbol):
+        with failures_lock:
+            if len(failures) >= max_failures:
+                failures[symbol] = "skipped after too many failures"
+                return None
+        for attempt in range(retries + 1):
+            bucket.acquire()
+            try:
+                with tracing.span(
+                    "fetch_fundamentals", symbol=symbol, attempt=attempt
+                ):
+                    info = provider(symbol)
+                return {field: info.get(field) for field in FUNDAMENTALS}
+            except Exception as e:
+                error = e
+            if attempt < retries:
+                time.sleep(backoff * 2 ** attempt)
+        with failures_lock:
+            failures[symbol] = str(error)
+        return None
+
+    with ThreadPoolExecutor(max_workers) as pool:
+        results = list(pool.map(fetch, symbols))
+
+    rows = {
+        symbol: row for symbol, row in zip(symbols, results)
+        if row is not None
+    }
+    fundamentals_data = pd.DataFrame.from_dict(
+        rows, orient="index", columns=FUNDAMENTALS
+    ).apply(pd.to_numeric, errors="coerce")
+    fundamentals_data.insert(0, "symbol", list(rows))
+    return fundamentals_data.reset_index(drop=True), failures
@@ -0,0 +1,271 @@
+"""
+A compact, array-backed table of fundamentals or percentile ranks.
+
+A DataFrame of fundamentals holds every ticker symbol as a Python
+string and every value as float64, and the ranking copies it at each
+step: dropping companies with missing data, selecting the factor
+columns and sorting by score. `FundamentalsTable` instead keeps the
+symbols as a categorical (one small integer code per row) and the
+values as one 2-D array with a row per column, so a column is a
+contiguous array and a run of columns is a view of the table rather
+than a copy. Percentile ranks, which have two decimals, are kept as
+float32. `FundamentalsHistory` keeps the fundamentals of many dates
+in one 3-D array whose table for a date is a view.
+
+`rank_companies` ranks the companies of an index through a table,
+so the refresher, batch mode and the API no longer copy the
+fundamentals at each step of the ranking.
+"""
+import numpy as np
+import pandas as pd
+
+from ranking import FACTOR_WEIGHTS, FACTORS, percentile_rank, score_stocks
+
+
+class FundamentalsTable:
+    """
+    The values of some columns for a list of companies.
+
+    Args:
+        symbols (list or pd.Categorical): The ticker symbol of each
+        company.
+        columns (list): The names of the columns.
+        values (np.ndarray): The values, of shape (columns, companies).
+        complete (np.ndarray, optional): Whether each company has a
+        value in every column of its DataFrame that is not in the
+        table, as recorded by `from_frame`. Defaults to all of them.
+    """
+
+    def __init__(self, symbols, columns, values, complete=None):
+        self.symbols = pd.Categorical(symbols)
+        self.columns = pd.Index(columns)
+        self.values = values
+        self.complete = complete
+        if values.shape != (len(self.columns), len(self.symbols)):
+            raise ValueError(
+                f"the values must be of shape ({len(self.columns)},"
+                f" {len(self.symbols)}), not {values.shape}"
+            )
+
+    @classmethod
+    def from_frame(cls, frame, dtype=np.float64, first=FACTORS):
+        """
+        Builds a table from a DataFrame of fundamentals with a
+        'symbol' column.
+
+        The `first` columns are placed first and in order, so that
+        selecting them, as the ranking does, is a view of the table.
+        Columns that are not numeric, other than 'symbol', are left
+        out, but the companies missing a value in them are recorded,
+        so that `complete_rows` drops the same companies as `dropna`
+        on the DataFrame.
+
+        Args:
+            frame (pd.DataFrame): The fundamentals.
+            dtype (optional): The type of the values.
+            first (list, optional): The columns to place first.
+            Defaults to `FACTORS`.
+        """
+        numeric = frame.drop(columns="symbol").select_dtypes("number")
+        columns = [c for c in first if c in numeric] + [
+            c for c in numeric if c not in first
+        ]
+        values = np.empty((len(columns), len(frame)), dtype=dtype)
+        for row, column in enumerate(columns):
+            values[row] = numeric[column].to_numpy(dtype=dtype)
+        other = frame.columns.difference(numeric.columns)
+        complete = frame[other].notna().all(axis=1).to_numpy()
+        return cls(
+            frame["symbol"],
+            columns,
+            values,
+            None if complete.all() else complete,
+        )
+
+    def __len__(self):
+        return len(self.symbols)
+
+    @property
+    def nbytes(self):
+        """The memory used by the values and symbols, in bytes."""
+        return self.values.nbytes + self.symbols.memory_usage(deep=True)
+
+    def column(self, name):
+        """Returns the values of a column, as a view of the table."""
+        return self.values[self.columns.get_loc(name)]
+
+    def select(self, columns):
+        """
+        Returns a table of some of the columns, in order. A run of
+        consecutive columns is a view of this table; any other
+        selection copies the columns that were asked for.
+
+        Raises:
+            KeyError: If a column is not in the table.
+        """
+        positions = self.columns.get_indexer(columns)
+        if (positions < 0).any():
+            missing = [c for c, p in zip(columns, positions) if p < 0]
+            raise KeyError(f"the table has no columns {missing}")
+        if len(positions) and (np.diff(positions) == 1).all():
+            positions = slice(positions[0], positions[-1] + 1)
+        return FundamentalsTable(
+            self.symbols,
+            self.columns[positions],
+            self.values[positions],
+            self.complete,
+        )
+
+    def take(self, rows):
+        """
+        Returns a table of some of the companies, given as positions
+        or a boolean mask.
+        """
+        return FundamentalsTable(
+            self.symbols[rows],
+            self.columns,
+            self.values[:, rows],
+            None if self.complete is None else self.complete[rows],
+        )
+
+    def complete_rows(self):
+        """
+        Returns the companies with no missing values, like `dropna`,
+        and this table itself, without a copy, if none are missing.
+        """
+        complete = ~np.isnan(self.values).any(axis=0)
+        if self.complete is not None:
+            complete &= self.complete
+        if complete.all():
+            return self
+        return self.take(complete)
+
+    def to_frame(self, symbol_column="symbol"):
+        """
+        Returns the table as a DataFrame with the symbols, as strings,
+        in the first column. The values are a view of the table.
+        """
+        frame = pd.DataFrame(self.values.T, columns=self.columns, copy=False)
+        frame.insert(0, symbol_column, np.asarray(self.symbols, dtype=object))
+        return frame
+
+
+def rank_table(
+    table, factors=FACTORS, weights=FACTOR_WEIGHTS, dtype=np.float32
+):
+    """
+    Scores and ranks the companies of a fundamentals table, as
+    `rank_companies` does for a DataFrame.
+
+    Companies with any missing value are removed, the factors are
+    converted into percentile ranks with `percentile_rank` and each
+    company is scored with `score_stocks`, both from the ranking
+    module, on a view of the table's factor columns. The scores are
+    calculated from the float64 ranks, so the order of the companies
+    does not depend on `dtype`, the type the ranks and scores are
+    then kept as.
+
+    Args:
+        table (FundamentalsTable): The fundamentals of the companies.
+        factors (list, optional): The factors to rank.
+        weights (dict, optional): The weight of each factor.
+        dtype (optional): The type of the ranks and scores. Defaults
+        to float32, which holds the two decimals of a percentile rank.
+
+    Returns:
+        FundamentalsTable: The companies sorted from the highest to
+        the lowest score, with a 'score' column and the percentile
+        rank of each factor.
+        int: The number of companies removed due to missing data.
+    """
+    factors = list(factors)
+    complete = table.complete_rows()
+    percentiles = percentile_rank(
+        pd.DataFrame(
+            complete.select(factors).values.T, columns=factors, copy=False
+        )
+    )
+    score = score_stocks(percentiles, weights)
+    order = score.sort_values(ascending=False).index.to_numpy()
+
+    ranked = np.empty((len(factors) + 1, len(order)), dtype=dtype)
+    ranked[0] = score.to_numpy()[order]
+    ranked[1:] = percentiles.to_numpy().T[:, order]
+    return (
+        FundamentalsTable(
+            complete.symbols[order], ["score"] + factors, ranked
+        ),
+        len(table) - len(complete),
+    )
+
+
+class FundamentalsHistory:
+    """
+    The fundamentals of a list of companies on many dates, in one
+    array of shape (dates, columns, companies).
+
+    Args:
+        dates (pd.DatetimeIndex): The dates, in order.
+        symbols (list or pd.Categorical): The ticker symbols.
+        columns (list): The names of the columns.
+        values (np.ndarray): The values, of shape (dates, columns,
+        companies), NaN where a company has no value on a date.
+    """
+
+    def __init__(self, dates, symbols, columns, values):
+        self.dates = pd.DatetimeIndex(dates)
+        self.symbols = pd.Categorical(symbols)
+        self.columns = pd.Index(columns)
+        self.values = values
+
+    @classmethod
+    def from_frame(
+        cls, frame, date_column="date", dtype=np.float32, first=FACTORS
+    ):
+        """
+        Builds a history from a long DataFrame with a row per company
+        and date, a 'symbol' column and a date column.
+
+        Args:
+            frame (pd.DataFrame): The fundamentals of every date.
+            date_column (str, optional): The name of the date column.
+            dtype (optional): The type of the values.
+            first (list, optional): The columns to place first.
+        """
+        dates, date_rows = np.unique(
+            frame[date_column].to_numpy(dtype="datetime64[ns]"),
+            return_inverse=True,
+        )
+        symbols = pd.Categorical(frame["symbol"])
+        table = FundamentalsTable.from_frame(
+            frame.drop(columns=date_column), dtype, first
+        )
+        values = np.full(
+            (len(dates), len(table.columns), len(symbols.categories)),
+            np.nan,
+            dtype=dtype,
+        )
+        values[date_rows, :, symbols.codes] = table.values.T
+        return cls(dates, symbols.categories, table.columns, values)
+
+    @property
+    def nbytes(self):
+        """The memory used by the values and symbols, in bytes."""
+        return (
+            self.values.nbytes
+            + self.dates.nbytes
+            + self.symbols.memory_usage(deep=True)
+        )
+
+    def at(self, date):
+        """
+        Returns the fundamentals of a date as a table, which is a view
+        of the history.
+
+        Raises:
+            KeyError: If there are no fundamentals for the date.
+        """
+        position = self.dates.get_loc(pd.Timestamp(date))
+        return FundamentalsTable(
+            self.symbols, self.columns, self.values[position]
+        )
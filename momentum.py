@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+# The look-back period of each momentum return
+HORIZONS = {
+    "1M": pd.DateOffset(months=1),
+    "3M": pd.DateOffset(months=3),
+    "6M": pd.DateOffset(months=6),
+    "12M": pd.DateOffset(months=12),
+}
+
+
+def horizon_returns(prices, as_of=None, horizons=HORIZONS):
+    """
+    Calculates the momentum returns and the last completed quarterly
+    return of every ticker in a price panel, as of a given date.
+
+    Only the prices known on `as_of` are used. Each return compares
+    the last price on or before `as_of` with the last price on or
+    before the start of the period, so weekends and holidays fall
+    back to the previous trading day, as with
+    `resample("Q").ffill()`. The quarterly return is that of the
+    last calendar quarter that ended on or before `as_of`. All the
+    prices needed are looked up at once for every ticker, so the
+    whole table is one array operation over the panel.
+
+    Args:
+        prices (pd.DataFrame): A price panel indexed by date with one
+        column per ticker.
+        as_of (datetime, optional): The date the returns are
+        calculated at. Defaults to the last date of the panel.
+        horizons (dict, optional): The look-back period of each
+        momentum return, keyed by column name.
+
+    Returns:
+        pd.DataFrame: A DataFrame indexed by ticker with one column
+        per horizon and a 'quarterlyReturn' column. Returns whose
+        start is before a ticker's first price are NaN.
+    """
+    prices = prices.sort_index()
+    as_of = prices.index[-1] if as_of is None else pd.Timestamp(as_of)
+    prices = prices.loc[:as_of].ffill()
+
+    quarter_end = as_of + pd.Timedelta(days=1) - pd.offsets.QuarterEnd(1)
+    previous_quarter_end = quarter_end - pd.offsets.QuarterEnd(1)
+    starts = [as_of - offset for offset in horizons.values()]
+    dates = pd.DatetimeIndex(
+        [as_of] + starts + [quarter_end, previous_quarter_end]
+    )
+
+    # The row of the last price on or before each date. Dates before
+    # the start of the panel point at an extra row of NaN.
+    rows = prices.index.searchsorted(dates, side="right") - 1
+    panel = np.vstack(
+        [prices.to_numpy(dtype=float), np.full(prices.shape[1], np.nan)]
+    )
+    values = panel[np.where(rows >= 0, rows, len(prices))]
+
+    latest, *bases, quarter, previous_quarter = values
+    returns = pd.DataFrame(
+        np.column_stack(
+            [latest / base - 1 for base in bases]
+            + [quarter / previous_quarter - 1]
+        ),
+        index=prices.columns,
+        columns=list(horizons) + ["quarterlyReturn"],
+    )
+    return returns
@@ -0,0 +1,310 @@
+import collections
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+# Trading days in a year, used to annualise daily estimates
+FREQUENCY = 252
+RISK_FREE_RATE = 0.02
+
+
+class RiskModel:
+    """
+    The returns, risk model and correlation clustering of a price
+    panel, each computed once and shared by every optimization method.
+
+    Every estimate is computed the first time a method needs it and
+    kept for the lifetime of the object, so running several methods on
+    the same panel does not recompute the risk model for each one.
+
+    Hierarchical Risk Parity (HRP) uses the sample covariance and a
+    single-linkage clustering of the correlations, exactly as
+    PyPortfolioOpt's HRPOpt does. The mean-variance methods use the
+    mean historical return and the Ledoit-Wolf shrunk covariance.
+    So that the methods can be compared side by side, the performance
+    of every method is measured the same way as HRPOpt measures it:
+    from the annualised mean and sample covariance of daily returns.
+
+    Args:
+        prices (pd.DataFrame): A DataFrame of historical prices with
+        one column per stock.
+        risk_free_rate (float, optional): The annual risk-free rate
+        used for Sharpe ratios.
+    """
+
+    def __init__(self, prices, risk_free_rate=RISK_FREE_RATE):
+        self.prices = prices
+        self.risk_free_rate = risk_free_rate
+
+    @cached_property
+    def returns(self):
+        """The daily returns of the stocks."""
+        return self.prices.pct_change().dropna()
+
+    @cached_property
+    def daily_mean(self):
+        """The mean daily return of each stock."""
+        return self.returns.mean()
+
+    @cached_property
+    def sample_cov(self):
+        """The daily sample covariance of the returns."""
+        return self.returns.cov()
+
+    @cached_property
+    def corr(self):
+        """The correlation matrix of the returns."""
+        return self.returns.corr()
+
+    @cached_property
+    def distance(self):
+        """The correlation distance between every pair of stocks."""
+        return np.sqrt(np.clip((1.0 - self.corr) / 2.0, 0.0, 1.0))
+
+    @cached_property
+    def linkage(self):
+        """
+        The single-linkage clustering of the correlation distance
+        between the stocks.
+        """
+        return _single_linkage(self.distance.to_numpy())
+
+    @cached_property
+    def mean_returns(self):
+        """The annualised mean historical return of each stock."""
+        from pypfopt.expected_returns import mean_historical_return
+
+        return mean_historical_return(self.prices, frequency=FREQUENCY)
+
+    @cached_property
+    def shrunk_cov(self):
+        """The annualised Ledoit-Wolf shrunk covariance matrix."""
+        from pypfopt.risk_models import CovarianceShrinkage
+
+        return CovarianceShrinkage(
+            self.prices, frequency=FREQUENCY
+        ).ledoit_wolf()
+
+    def performance(self, weights):
+        """
+        Returns the expected annual return, annual volatility and
+        Sharpe ratio of a portfolio, from the annualised mean and
+        sample covariance of daily returns.
+        """
+        from pypfopt.base_optimizer import portfolio_performance
+
+        return portfolio_performance(
+            weights,
+            self.daily_mean * FREQUENCY,
+            self.sample_cov * FREQUENCY,
+            risk_free_rate=self.risk_free_rate,
+        )
+
+    def hrp(self):
+        """Returns the Hierarchical Risk Parity weights."""
+        from pypfopt import HRPOpt
+
+        sort_ix = HRPOpt._get_quasi_diag(self.linkage)
+        ordered_tickers = self.corr.index[sort_ix].tolist()
+        weights = HRPOpt._raw_hrp_allocation(self.sample_cov, ordered_tickers)
+        return collections.OrderedDict(weights.sort_index())
+
+    def min_volatility(self):
+        """Returns the long-only minimum volatility weights."""
+        from pypfopt.efficient_frontier import EfficientFrontier
+
+        ef = EfficientFrontier(self.mean_returns, self.shrunk_cov)
+        ef.min_volatility()
+        return ef.clean_weights()
+
+    def max_sharpe(self):
+        """Returns the long-only maximum Sharpe ratio weights."""
+        from pypfopt.efficient_frontier import EfficientFrontier
+
+        ef = EfficientFrontier(self.mean_returns, self.shrunk_cov)
+        ef.max_sharpe(risk_free_rate=self.risk_free_rate)
+        return ef.clean_weights()
+
+    def equal_weight(self):
+        """Returns equal weights, as a baseline for the other methods."""
+        tickers = self.sample_cov.index
+        return collections.OrderedDict(
+            (ticker, 1.0 / len(tickers)) for ticker in tickers
+        )
+
+
+def size_sweep(prices, ranked_symbols, min_size=3, risk_model=None):
+    """
+    Calculates the HRP portfolio of every top-k prefix of a ranked
+    list of stocks, for k from `min_size` up to the whole list.
+
+    Each portfolio is estimated from the days on which all of its k
+    stocks have a price, so its result is the same as optimizing its
+    stocks on their own, and a stock listed late only shortens the
+    history of the sizes that include it. The prefixes that share
+    their latest listed stock share those days, so their returns,
+    covariance and correlation distance are computed once, for the
+    longest of them, and each portfolio only slices them. The work
+    per portfolio size is then the clustering and the bisection of
+    its k stocks.
+
+    Args:
+        prices (pd.DataFrame): A DataFrame of historical prices with
+        a column for each stock in `ranked_symbols`.
+        ranked_symbols (list): The stocks from the highest to the
+        lowest ranked.
+        min_size (int, optional): The smallest portfolio size.
+        risk_model (RiskModel, optional): An existing risk model of the
+        ranked stocks' prices to reuse.
+
+    Returns:
+        pd.DataFrame: The expected annual return, annual volatility and
+        Sharpe ratio (columns) of each portfolio size (rows).
+        pd.DataFrame: The weight of each stock (columns) for each
+        portfolio size (rows).
+    """
+    ranked_symbols = list(ranked_symbols)
+    risk_free_rate = (
+        risk_model.risk_free_rate if risk_model else RISK_FREE_RATE
+    )
+    # The first day of each prefix's returns, that of the latest
+    # listed of its stocks. It only grows with the prefix, so the
+    # prefixes sharing it are the sizes up to the longest of them.
+    listed = prices[ranked_symbols].apply(pd.Series.first_valid_index)
+    latest_listed = listed.cummax().to_numpy()
+    estimates = {}
+
+    sizes = range(min_size, len(ranked_symbols) + 1)
+    weights = np.zeros((len(sizes), len(ranked_symbols)))
+    expected_return = np.zeros(len(sizes))
+    variance = np.zeros(len(sizes))
+    for row, size in enumerate(sizes):
+        shared = int(np.sum(latest_listed <= latest_listed[size - 1]))
+        if shared not in estimates:
+            symbols = ranked_symbols[:shared]
+            if risk_model and shared == len(ranked_symbols):
+                model = risk_model
+            else:
+                model = RiskModel(prices[symbols], risk_free_rate)
+            estimates[shared] = (
+                model.sample_cov.loc[symbols, symbols].to_numpy(),
+                model.distance.loc[symbols, symbols].to_numpy(),
+                model.daily_mean[symbols].to_numpy(),
+            )
+        cov, distance, mean = estimates[shared]
+        cov = cov[:size, :size]
+        order = _quasi_diag(_single_linkage(distance[:size, :size]))
+        weights[row, :size] = _hrp_allocation(cov, order)
+        expected_return[row] = weights[row, :size] @ mean[:size]
+        variance[row] = weights[row, :size] @ cov @ weights[row, :size]
+
+    expected_return *= FREQUENCY
+    volatility = np.sqrt(variance * FREQUENCY)
+    curve = pd.DataFrame(
+        {
+            "expected_annual_return": expected_return,
+            "annual_volatility": volatility,
+            "sharpe_ratio": (
+                expected_return - risk_free_rate
+            ) / volatility,
+        },
+        index=pd.Index(sizes, name="size"),
+    )
+    return curve, pd.DataFrame(
+        weights, index=curve.index, columns=ranked_symbols
+    )
+
+
+def _single_linkage(distance):
+    import scipy.cluster.hierarchy as sch
+    import scipy.spatial.distance as ssd
+
+    return sch.linkage(ssd.squareform(distance, checks=False), "single")
+
+
+def _quasi_diag(linkage):
+    """
+    Returns the positions of the stocks in the order of the leaves
+    of the clustering tree, as HRPOpt._get_quasi_diag does.
+    """
+    import scipy.cluster.hierarchy as sch
+
+    return sch.leaves_list(linkage)
+
+
+def _hrp_allocation(cov, order):
+    """
+    Returns the HRP weights of the stocks given their covariance
+    matrix and cluster order, by recursively splitting the ordered
+    stocks in two and dividing each cluster's weight between its
+    halves in inverse proportion to their variances. This is
+    HRPOpt._raw_hrp_allocation working on positions in a NumPy array.
+    """
+    weights = np.ones(len(order))
+    clusters = [np.asarray(order)]
+    while clusters:
+        clusters = [
+            half
+            for cluster in clusters
+            if len(cluster) > 1
+            for half in np.split(cluster, [len(cluster) // 2])
+        ]
+        for first, second in zip(clusters[::2], clusters[1::2]):
+            first_variance = _cluster_variance(cov, first)
+            second_variance = _cluster_variance(cov, second)
+            alpha = 1 - first_variance / (first_variance + second_variance)
+            weights[first] *= alpha
+            weights[second] *= 1 - alpha
+    return weights
+
+
+def _cluster_variance(cov, items):
+    """
+    Returns the variance of a cluster's inverse-variance portfolio.
+    """
+    cov_slice = cov[np.ix_(items, items)]
+    weights = 1 / np.diag(cov_slice)
+    weights /= weights.sum()
+    return weights @ cov_slice @ weights
+
+
+# The optimization methods that can be compared
+METHODS = ["hrp", "min_volatility", "max_sharpe", "equal_weight"]
+
+
+def compare_methods(prices, methods=METHODS, risk_model=None):
+    """
+    Optimizes a portfolio with several methods from one shared
+    risk model and returns their weights and performance side by side.
+
+    Args:
+        prices (pd.DataFrame): A DataFrame of historical prices with
+        one column per stock.
+        methods (list, optional): The names of the `RiskModel` methods
+        to run. Defaults to all of `METHODS`.
+        risk_model (RiskModel, optional): An existing risk model of the
+        prices to reuse.
+
+    Returns:
+        pd.DataFrame: The weight of each stock (rows) for each method
+        (columns).
+        pd.DataFrame: The expected annual return, annual volatility and
+        Sharpe ratio (columns) of each method (rows).
+    """
+    risk_model = risk_model or RiskModel(prices)
+    weights = {}
+    performance = {}
+    for method in methods:
+        weights[method] = getattr(risk_model, method)()
+        performance[method] = risk_model.performance(weights[method])
+    return (
+        pd.DataFrame(weights).reindex(prices.columns).fillna(0.0),
+        pd.DataFrame.from_dict(
+            performance,
+            orient="index",
+            columns=[
+                "expected_annual_return", "annual_volatility", "sharpe_ratio"
+            ],
+        ),
+    )
@@ -0,0 +1,216 @@
+import datetime as dt
+import fcntl
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+# Directory that holds one CSV of adjusted close prices per ticker
+CACHE_DIR = os.environ.get("INVESTIQ_PRICE_CACHE", "price_cache")
+INDEX_FILE = "index.json"
+LOCK_FILE = ".lock"
+# The days already cached that each download covers again, to check
+# that their adjusted prices have not changed
+OVERLAP = dt.timedelta(days=7)
+
+
+def cached_price_panel(tickers, start, end, fetch, cache_dir=CACHE_DIR):
+    """
+    Builds a price panel for a list of tickers from the local
+    price cache, downloading only the days that are missing.
+
+    Each ticker's prices are kept in their own CSV file keyed by
+    trading date, next to an index recording the window that has
+    already been synced for the ticker. Tickers that are fully
+    synced up to `end` are served from disk without any network
+    call. The others are grouped by the first day they are missing
+    and each group is fetched with a single call to `fetch`.
+    Downloads happen outside the cache lock, and the new prices are
+    merged into whatever is on disk at write time, so several
+    sessions can update the cache at once without losing data.
+
+    Adjusted prices change all the way back whenever a company pays
+    a dividend or splits its stock, so each download also covers the
+    last `OVERLAP` of days already cached. A ticker whose downloaded
+    prices no longer match its cached prices on those days has its
+    whole window downloaded again and replaced.
+
+    Args:
+        tickers (list): A list of strings representing the
+        stock tickers to build the panel for.
+        start (datetime): The start date of the price window.
+        end (datetime): The end date of the price window
+        (exclusive, as with yfinance).
+        fetch (callable): A function taking `(tickers, start, end)`
+        and returning a price panel with one column per ticker.
+        cache_dir (str, optional): The directory of the cache.
+
+    Returns:
+        pd.DataFrame: A DataFrame indexed by date with one column
+        of adjusted close prices per ticker, covering the window
+        from `start` to `end`.
+    """
+    tickers = list(tickers)
+    start = pd.Timestamp(start).normalize()
+    end = pd.Timestamp(end).normalize()
+    os.makedirs(cache_dir, exist_ok=True)
+
+    with _locked(cache_dir):
+        index = _read_index(cache_dir)
+
+    # Group the stale tickers by the first day that they are missing
+    to_fetch = {}
+    for ticker in tickers:
+        entry = index.get(ticker)
+        if entry is None or pd.Timestamp(entry["start"]) > start:
+            fetch_start = start
+        elif pd.Timestamp(entry["synced"]) < end:
+            fetch_start = max(
+                pd.Timestamp(entry["synced"]) - OVERLAP,
+                pd.Timestamp(entry["start"]),
+            )
+        else:
+            continue
+        to_fetch.setdefault(fetch_start, []).append(ticker)
+
+    readjusted = []
+    for fetch_start, group in to_fetch.items():
+        print(f"Fetching pricing data for {len(group)} tickers")
+        fetched = fetch(group, fetch_start, end)
+        if fetched.dropna(how="all").empty:
+            continue
+        with _locked(cache_dir):
+            for ticker in group:
+                cached = _read_ticker(cache_dir, ticker)
+                if _readjusted(fetched[ticker], cached):
+                    readjusted.append(ticker)
+            _store(
+                cache_dir,
+                fetched[[t for t in group if t not in readjusted]],
+                fetch_start,
+                end,
+            )
+
+    if readjusted:
+        print(f"Fetching adjusted pricing data for {len(readjusted)} tickers")
+        fetched = fetch(readjusted, start, end)
+        with _locked(cache_dir):
+            _store(cache_dir, fetched, start, end, replace=True)
+
+    with _locked(cache_dir):
+        columns = {
+            ticker: _read_ticker(cache_dir, ticker) for ticker in tickers
+        }
+    panel = pd.DataFrame(columns).sort_index()
+    return panel.loc[start:end - dt.timedelta(days=1)].reindex(
+        columns=tickers
+    )
+
+
+def _readjusted(fetched, cached):
+    """
+    Returns whether the adjusted prices of a ticker downloaded for
+    days that are already cached differ from the cached prices.
+    """
+    fetched = fetched.dropna()
+    common = fetched.index.intersection(cached.index)
+    return not np.allclose(
+        fetched[common].to_numpy(), cached[common].to_numpy(), rtol=1e-6
+    )
+
+
+def _store(cache_dir, fetched, fetch_start, end, replace=False):
+    """
+    Writes the prices fetched for a group of tickers into the cache
+    and records the window synced for each of them, merging them
+    into the cached prices unless `replace` is true. The cache must
+    be locked.
+    """
+    index = _read_index(cache_dir)
+    for ticker in fetched.columns:
+        prices = fetched[ticker].dropna()
+        if prices.empty:
+            continue
+        if not replace:
+            prices = prices.combine_first(_read_ticker(cache_dir, ticker))
+        _write_ticker(cache_dir, ticker, prices)
+        entry = {} if replace else index.get(ticker, {})
+        index[ticker] = {
+            "start": str(min(
+                fetch_start,
+                pd.Timestamp(entry.get("start", fetch_start)),
+            ).date()),
+            "synced": str(max(
+                end,
+                pd.Timestamp(entry.get("synced", end)),
+            ).date()),
+        }
+    _write_json(os.path.join(cache_dir, INDEX_FILE), index)
+
+
+@contextmanager
+def _locked(cache_dir):
+    """
+    Holds an exclusive lock on the cache directory so that
+    concurrent sessions read and write it one at a time.
+    """
+    with open(os.path.join(cache_dir, LOCK_FILE), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _ticker_path(cache_dir, ticker):
+    return os.path.join(cache_dir, ticker.replace("/", "_") + ".csv")
+
+
+def _read_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, INDEX_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _read_ticker(cache_dir, ticker):
+    try:
+        prices = pd.read_csv(
+            _ticker_path(cache_dir, ticker), index_col=0, parse_dates=True
+        ).iloc[:, 0]
+    except FileNotFoundError:
+        return pd.Series(
+            dtype=float, name=ticker, index=pd.DatetimeIndex([])
+        )
+    return prices.rename(ticker)
+
+
+def _write_ticker(cache_dir, ticker, prices):
+    atomic_write(
+        _ticker_path(cache_dir, ticker),
+        lambda f: prices.rename("Adj Close").to_csv(f, index_label="Date"),
+    )
+
+
+def _write_json(path, data):
+    atomic_write(path, lambda f: json.dump(data, f, indent=1))
+
+
+def atomic_write(path, write, mode="w"):
+    """
+    Writes a file through a temporary file and a rename, so that
+    readers never see a partially written file. Pass `mode="wb"`
+    to write binary data.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -0,0 +1,242 @@
+"""
+A columnar on-disk store of price histories, read through memory
+maps.
+
+Each field (adjusted close prices by default) is kept as one NumPy
+array file of shape (dates, tickers) in column-major order, so each
+ticker's history is contiguous on disk. The trading dates and
+tickers are kept alongside. Readers map the files rather than load
+them, so slices are read lazily and every process reading the store
+shares the same pages of the operating system's file cache instead
+of holding its own copy of the history.
+
+Usage:
+    python price_store.py prices.csv price_store
+"""
+import argparse
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from price_cache import atomic_write
+
+# The metadata of the store, naming the files of its current version
+META_FILE = "meta.json"
+# The field of a store built from a panel of adjusted close prices
+CLOSE = "close"
+# How many times to open a store whose version is removed while it
+# is being opened, before giving up
+OPEN_ATTEMPTS = 5
+
+
+class PriceStore:
+    """
+    A read-only view of a price store written by `write_store`.
+
+    Every field is memory-mapped when the store is opened, which
+    reads no prices until they are used. A slice of a range of dates
+    and a consecutive run of tickers is returned as a DataFrame over
+    the mapped file without copying any prices. Any other selection
+    of tickers copies only the columns that were asked for.
+
+    Replacing the store with `write_store` while it is open is safe:
+    open stores keep reading the version they mapped, and stores
+    opened afterwards see the new one. A store opened while its
+    version is being removed by a later write opens the newer
+    version instead.
+
+    Args:
+        path (str): The directory of the store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        for attempt in range(OPEN_ATTEMPTS):
+            try:
+                self._open()
+                break
+            except FileNotFoundError:
+                if attempt == OPEN_ATTEMPTS - 1:
+                    raise
+
+    def _open(self):
+        meta = _read_meta(self.path)
+        self.version = meta["version"]
+        self.tickers = pd.Index(meta["tickers"])
+        self.dates = pd.DatetimeIndex(
+            self._load("dates").astype("datetime64[ns]"), name="Date"
+        )
+        self._arrays = {field: self._load(field) for field in meta["fields"]}
+
+    @property
+    def fields(self):
+        """The names of the fields in the store."""
+        return list(self._arrays)
+
+    def array(self, field=CLOSE):
+        """
+        Returns the memory-mapped array of a field, of shape
+        (dates, tickers).
+        """
+        if field not in self._arrays:
+            raise KeyError(f"the store has no '{field}' field")
+        return self._arrays[field]
+
+    def _load(self, name):
+        return np.load(
+            os.path.join(self.path, _file_name(name, self.version)),
+            mmap_mode="r",
+        )
+
+    def panel(self, tickers=None, start=None, end=None, field=CLOSE):
+        """
+        Returns the prices of some tickers over a range of dates.
+
+        Args:
+            tickers (list, optional): The tickers to return, in order.
+            Defaults to every ticker in the store.
+            start (datetime, optional): The first date, inclusive.
+            end (datetime, optional): The last date, inclusive.
+            field (str, optional): The field to read.
+
+        Returns:
+            pd.DataFrame: A read-only DataFrame indexed by date with
+            one column per ticker.
+
+        Raises:
+            KeyError: If a ticker or the field is not in the store.
+        """
+        rows = slice(
+            None if start is None else self.dates.searchsorted(
+                pd.Timestamp(start)
+            ),
+            None if end is None else self.dates.searchsorted(
+                pd.Timestamp(end), side="right"
+            ),
+        )
+        columns = self._columns(tickers)
+        values = self.array(field)[rows, columns]
+        return pd.DataFrame(
+            values,
+            index=self.dates[rows],
+            columns=self.tickers[columns],
+            copy=False,
+        )
+
+    def _columns(self, tickers):
+        """
+        Returns the positions of the tickers in the arrays, as a slice
+        when they are a consecutive run so that no prices are copied.
+        """
+        if tickers is None:
+            return slice(None)
+        positions = self.tickers.get_indexer(tickers)
+        if (positions < 0).any():
+            missing = [t for t, p in zip(tickers, positions) if p < 0]
+            raise KeyError(f"the store has no prices for {missing}")
+        if len(positions) and (np.diff(positions) == 1).all():
+            return slice(positions[0], positions[-1] + 1)
+        return positions
+
+
+def write_store(path, panels):
+    """
+    Writes price panels to a store, replacing any store already at
+    `path`.
+
+    The files of the new version are written under new names and
+    the metadata, which names the version, is replaced last, so a
+    store being read is never seen half written. The files of the
+    versions before the one replaced are then removed; stores that
+    have them open keep reading them until they are closed. The
+    version replaced is kept until the next write, so a store that
+    read its metadata just before the replacement can still open it.
+
+    Args:
+        path (str): The directory of the store.
+        panels (dict): A price panel per field name, each indexed by
+        date with one column per ticker. Every panel is aligned to the
+        dates and tickers of the first.
+    """
+    os.makedirs(path, exist_ok=True)
+    try:
+        previous = _read_meta(path)["version"]
+    except FileNotFoundError:
+        previous = None
+    version = uuid.uuid4().hex
+    first = next(iter(panels.values())).sort_index()
+    dates = first.index
+    tickers = first.columns
+    _save_array(
+        path, "dates", version, dates.values.astype("datetime64[D]")
+    )
+    for field, panel in panels.items():
+        values = panel.reindex(index=dates, columns=tickers)
+        _save_array(
+            path,
+            field,
+            version,
+            np.asfortranarray(values.to_numpy(dtype=np.float64)),
+        )
+    atomic_write(
+        os.path.join(path, META_FILE),
+        lambda f: json.dump(
+            {
+                "version": version,
+                "fields": list(panels),
+                "tickers": tickers.tolist(),
+            },
+            f,
+        ),
+    )
+    keep = (f".{version}.npy", f".{previous}.npy")
+    for name in os.listdir(path):
+        if name.endswith(".npy") and not name.endswith(keep):
+            try:
+                os.unlink(os.path.join(path, name))
+            except FileNotFoundError:
+                pass
+
+
+def _read_meta(path):
+    with open(os.path.join(path, META_FILE)) as f:
+        return json.load(f)
+
+
+def _file_name(name, version):
+    return f"{name}.{version}.npy"
+
+
+def _save_array(path, name, version, array):
+    atomic_write(
+        os.path.join(path, _file_name(name, version)),
+        lambda f: np.save(f, array),
+        mode="wb",
+    )
+
+
+def main():
+    """
+    Builds a price store from a csv file of adjusted close prices
+    with a 'Date' column and one column per ticker.
+    """
+    parser = argparse.ArgumentParser(
+        description="Build a memory-mapped price store from a csv file."
+    )
+    parser.add_argument("prices", help="csv file of the price panel")
+    parser.add_argument("store", help="the directory of the store")
+    args = parser.parse_args()
+
+    prices = pd.read_csv(args.prices, index_col="Date", parse_dates=True)
+    write_store(args.store, {CLOSE: prices})
+    print(
+        f"Stored {prices.shape[1]} tickers over {prices.shape[0]} days"
+        f" in {args.store}"
+    )
+
+
+if __name__ == "__main__":
+    main()
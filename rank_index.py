@@ -0,0 +1,330 @@
+"""
+Incremental percentile ranking for fundamentals that arrive one
+company at a time.
+
+`RankIndex` keeps one order-statistic tree of values per factor, so
+adding, changing or removing one company costs O(log n) per factor,
+and the percentile ranks and score of any company can be read in
+O(log n) per factor, without ranking the whole table again.
+"""
+import random
+
+import numpy as np
+import pandas as pd
+
+from ranking import FACTOR_WEIGHTS, FACTORS, INVERSE_FACTORS, score_stocks
+
+# The decimals of the scores compared when sorting the table; the
+# percentile ranks have two, so equal scores agree to many more
+SCORE_DECIMALS = 8
+
+
+class _Node:
+    __slots__ = ("key", "count", "size", "priority", "left", "right")
+
+    def __init__(self, key, priority):
+        self.key = key
+        self.count = 1
+        self.size = 1
+        self.priority = priority
+        self.left = None
+        self.right = None
+
+
+def _size(node):
+    return node.size if node else 0
+
+
+def _update(node):
+    node.size = node.count + _size(node.left) + _size(node.right)
+
+
+def _rotate_right(node):
+    left = node.left
+    node.left = left.right
+    left.right = node
+    _update(node)
+    _update(left)
+    return left
+
+
+def _rotate_left(node):
+    right = node.right
+    node.right = right.left
+    right.left = node
+    _update(node)
+    _update(right)
+    return right
+
+
+class OrderStatisticTree:
+    """
+    A multiset of numbers that counts how many of its values are
+    below a given value in O(log n).
+
+    The values are kept in a treap: a binary search tree whose nodes
+    also carry a random priority and are kept in heap order of it, so
+    the tree stays balanced with an expected depth of O(log n). Each
+    node stores one distinct value with the number of times it was
+    inserted, and the total count of its subtree, which is what makes
+    counting by value O(log n).
+
+    Args:
+        seed (int, optional): The seed of the node priorities.
+    """
+
+    def __init__(self, seed=0):
+        self.root = None
+        self._random = random.Random(seed)
+
+    def __len__(self):
+        return _size(self.root)
+
+    def insert(self, value):
+        """Adds a value to the tree."""
+        self.root = self._insert(self.root, value)
+
+    def _insert(self, node, value):
+        if node is None:
+            return _Node(value, self._random.random())
+        if value < node.key:
+            node.left = self._insert(node.left, value)
+            node.size += 1
+            if node.left.priority > node.priority:
+                node = _rotate_right(node)
+        elif value > node.key:
+            node.right = self._insert(node.right, value)
+            node.size += 1
+            if node.right.priority > node.priority:
+                node = _rotate_left(node)
+        else:
+            node.count += 1
+            node.size += 1
+        return node
+
+    def remove(self, value):
+        """
+        Removes one occurrence of a value from the tree.
+
+        Raises:
+            KeyError: If the value is not in the tree.
+        """
+        self.root = self._remove(self.root, value)
+
+    def _remove(self, node, value):
+        if node is None:
+            raise KeyError(value)
+        if value < node.key:
+            node.left = self._remove(node.left, value)
+        elif value > node.key:
+            node.right = self._remove(node.right, value)
+        elif node.count > 1:
+            node.count -= 1
+        elif node.left is None or node.right is None:
+            return node.left or node.right
+        else:
+            # Rotate the node down below its higher priority child,
+            # until it has at most one child and can be unlinked
+            if node.left.priority > node.right.priority:
+                node = _rotate_right(node)
+                node.right = self._remove(node.right, value)
+            else:
+                node = _rotate_left(node)
+                node.left = self._remove(node.left, value)
+        _update(node)
+        return node
+
+    def count_less(self, value):
+        """Returns the number of values below `value`."""
+        count = 0
+        node = self.root
+        while node:
+            if value <= node.key:
+                node = node.left
+            else:
+                count += _size(node.left) + node.count
+                node = node.right
+        return count
+
+    def count_less_equal(self, value):
+        """Returns the number of values equal to or below `value`."""
+        count = 0
+        node = self.root
+        while node:
+            if value < node.key:
+                node = node.left
+            else:
+                count += _size(node.left) + node.count
+                node = node.right
+        return count
+
+
+class RankIndex:
+    """
+    The percentile ranks and scores of a changing set of companies,
+    kept up to date one company at a time.
+
+    The percentile ranks are the same as ranking the current companies
+    with `rank_companies`: companies with any missing value are left
+    out and each factor's percentile rank matches `percentile_rank`.
+    The scores are those of `score_stocks`, up to the last digits, as
+    they are summed in a different order. Adding, updating or removing
+    a company is O(F log n) for F factors and n companies, as is
+    reading one company's percentile ranks or score. The full ranked
+    table is O(n F log n), but in Python, so it is much slower than
+    `rank_companies` (about 16 times for 5,000 companies); reading
+    every company at once is best done with `rank_companies`.
+
+    Args:
+        factors (list, optional): The factors to rank. Defaults to
+        `FACTORS`.
+        weights (dict, optional): The factor weights of the score.
+        Defaults to `FACTOR_WEIGHTS`.
+    """
+
+    def __init__(self, factors=FACTORS, weights=FACTOR_WEIGHTS):
+        self.factors = list(factors)
+        self.weights = weights
+        self.weight_vector = (
+            pd.Series(weights, dtype=float)
+            .reindex(self.factors, fill_value=0.0)
+            .to_numpy()
+        )
+        self.trees = {
+            factor: OrderStatisticTree(seed) for seed, factor
+            in enumerate(self.factors)
+        }
+        # The factor values of the ranked companies, in insertion order
+        self.values = {}
+        # The companies left out of the ranking for missing data
+        self.incomplete = set()
+
+    @classmethod
+    def from_frame(
+        cls, fundamentals_data, factors=FACTORS, weights=FACTOR_WEIGHTS
+    ):
+        """
+        Builds an index from a fundamentals table with a 'symbol'
+        column and a column per factor, as given to `rank_companies`.
+        """
+        index = cls(factors, weights)
+        data = fundamentals_data.set_index("symbol")
+        complete = data.notna().all(axis=1).to_numpy()
+        rows = data[index.factors].to_numpy(dtype=float)
+        for symbol, row, is_complete in zip(data.index, rows, complete):
+            index.remove(symbol)
+            if is_complete:
+                index._insert(symbol, row)
+            else:
+                index.incomplete.add(symbol)
+        return index
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, symbol):
+        return symbol in self.values
+
+    def update(self, symbol, values):
+        """
+        Adds a company, or replaces its factor values if it is already
+        in the index. A company missing any factor, or with any other
+        value missing, is left out of the ranking until it is updated
+        with all of them.
+
+        Args:
+            symbol (str): The ticker symbol of the company.
+            values (dict or pd.Series): The value of each factor, and
+            optionally other fundamentals.
+        """
+        self.remove(symbol)
+        row = np.array(
+            [values.get(factor, np.nan) for factor in self.factors],
+            dtype=float,
+        )
+        if np.isnan(row).any() or pd.Series(values).isna().any():
+            self.incomplete.add(symbol)
+        else:
+            self._insert(symbol, row)
+
+    def _insert(self, symbol, row):
+        for factor, value in zip(self.factors, row):
+            self.trees[factor].insert(value)
+        self.values[symbol] = row
+
+    def remove(self, symbol):
+        """Removes a company, if it is in the index."""
+        self.incomplete.discard(symbol)
+        row = self.values.pop(symbol, None)
+        if row is None:
+            return
+        for factor, value in zip(self.factors, row):
+            self.trees[factor].remove(value)
+
+    def percentiles(self, symbol):
+        """
+        Returns the percentile rank of each factor of a company.
+
+        Raises:
+            KeyError: If the company is not ranked.
+        """
+        return pd.Series(
+            self._percentiles(self.values[symbol]),
+            index=self.factors,
+            name=symbol,
+        )
+
+    def _percentiles(self, row):
+        scale = 50.0 / len(self.values)
+        percentiles = np.empty(len(self.factors))
+        for column, (factor, value) in enumerate(zip(self.factors, row)):
+            tree = self.trees[factor]
+            # Twice the average rank, as in `percentile_rank`
+            ranks = tree.count_less(value) + tree.count_less_equal(value) + 1
+            percentiles[column] = ranks * scale
+            if factor in INVERSE_FACTORS:
+                percentiles[column] = 100 - percentiles[column]
+        return percentiles.round(2)
+
+    def score(self, symbol):
+        """
+        Returns the score of a company. It can differ from its score in
+        `table` in the last digits, as a single row is summed in a
+        different order than a table.
+        """
+        percentiles = self._percentiles(self.values[symbol])
+        return float(percentiles @ self.weight_vector)
+
+    def table(self):
+        """
+        Returns the ranked table of every company, in the form of
+        `rank_companies`. Companies with the same score are listed in
+        the order they were added to the index, whereas the order of
+        tied companies from `rank_companies` is not defined.
+
+        Returns:
+            pd.DataFrame: The companies sorted from the highest to the
+            lowest score, with a 'symbols' column, a 'score' column and
+            the percentile rank of each factor.
+            int: The number of companies left out for missing data.
+        """
+        table = pd.DataFrame(
+            np.reshape(
+                [self._percentiles(row) for row in self.values.values()],
+                (len(self.values), len(self.factors)),
+            ),
+            columns=self.factors,
+        )
+        table["symbols"] = np.array(list(self.values), dtype=object)
+        table["score"] = score_stocks(table, self.weights)
+        # Compare the scores without their last digits, which depend on
+        # the order they are summed in, so ties keep the order of adding
+        table.sort_values(
+            "score",
+            ascending=False,
+            kind="stable",
+            key=lambda score: score.round(SCORE_DECIMALS),
+            inplace=True,
+        )
+        table = table[["symbols", "score"] + self.factors]
+        return table.reset_index(drop=True), len(self.incomplete)
@@ -0,0 +1,292 @@
+"""
+Background refresher that keeps the data of each stock index ready
+for the interactive sessions.
+
+On a schedule the refresher collects each index's constituents,
+fundamentals and prices, calculates the quarterly returns, ranks the
+companies, and publishes the result as a snapshot. Sessions load the
+last published snapshot straight away, without downloading anything,
+and if it is out of date they start a refresh in the background for
+the sessions that come after them (stale-while-revalidate). A refresh
+that fails leaves the last good snapshot in place.
+
+The prices, fundamentals and ranking of a snapshot are memory-mapped
+files (see price_store.py and shared_table.py), so the sessions
+running on one host share one copy of them in memory rather than
+each holding its own.
+
+Usage:
+    python refresher.py [--interval SECONDS] [--once] [index ...]
+"""
+import argparse
+import collections
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import uuid
+
+from price_cache import atomic_write
+from price_store import CLOSE, PriceStore, write_store
+from shared_table import read_table, write_table
+from utils import (
+    INDEX_URLS,
+    collect_data,
+    download_price_panel,
+    process_data,
+    rank_companies,
+    scrape_company_tickers,
+)
+
+# Directory of the published snapshots, one subdirectory per index
+REFRESH_DIR = os.environ.get("INVESTIQ_REFRESH_DIR", "refresh_cache")
+# How often, in seconds, each index is refreshed
+INTERVAL = float(os.environ.get("INVESTIQ_REFRESH_INTERVAL", 6 * 3600))
+# The file naming the current snapshot of an index
+CURRENT_FILE = "current.json"
+
+Snapshot = collections.namedtuple(
+    "Snapshot", ["fundamentals", "prices", "ranking", "removed", "refreshed"]
+)
+
+
+def refresh_index(index, refresh_dir=REFRESH_DIR):
+    """
+    Collects the data of an index and publishes it as a new snapshot.
+
+    The fundamentals (with their quarterly returns), price panel and
+    ranking are written to a new version directory, and the index's
+    current file is then switched to it, so readers always see a
+    complete snapshot. The ranking is only recalculated when the
+    fundamentals have changed since the last snapshot. Only one
+    process refreshes an index at a time; others return at once.
+
+    Args:
+        index (str): The index, one of the keys of `INDEX_URLS`.
+        refresh_dir (str, optional): The directory of the snapshots.
+
+    Returns:
+        bool: Whether a snapshot was published, False if another
+        process was already refreshing the index.
+    """
+    index_dir = os.path.join(refresh_dir, index)
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, ".lock"), "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+
+        symbols = scrape_company_tickers(INDEX_URLS[index])
+        fundamentals_data, symbols = collect_data(symbols)
+        price_panel = download_price_panel(fundamentals_data["symbol"])
+        fundamentals_data["quarterlyReturn"] = process_data(
+            fundamentals_data["symbol"], prices=price_panel)
+        fundamentals_csv = fundamentals_data.to_csv(index=False)
+        digest = hashlib.sha256(fundamentals_csv.encode()).hexdigest()
+
+        current = _read_current(index_dir)
+        version = uuid.uuid4().hex
+        version_dir = os.path.join(index_dir, version)
+        os.makedirs(version_dir)
+        write_store(os.path.join(version_dir, "prices"), {CLOSE: price_panel})
+        write_table(
+            os.path.join(version_dir, "fundamentals"), fundamentals_data
+        )
+        if current and current["digest"] == digest:
+            shutil.copytree(
+                os.path.join(index_dir, current["version"], "ranking"),
+                os.path.join(version_dir, "ranking"),
+            )
+            removed_companies = current["removed"]
+        else:
+            ranking, removed_companies = rank_companies(fundamentals_data)
+            write_table(os.path.join(version_dir, "ranking"), ranking)
+
+        atomic_write(
+            os.path.join(index_dir, CURRENT_FILE),
+            lambda f: json.dump(
+                {
+                    "version": version,
+                    "digest": digest,
+                    "removed": int(removed_companies),
+                    "refreshed": time.time(),
+                },
+                f,
+            ),
+        )
+        # Sessions that have the older prices mapped keep reading them
+        for name in os.listdir(index_dir):
+            path = os.path.join(index_dir, name)
+            if name != version and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+    return True
+
+
+def load_snapshot(index, refresh_dir=REFRESH_DIR):
+    """
+    Returns the current snapshot of an index, or None if the index
+    has not been refreshed yet. The DataFrames of the snapshot are
+    read-only views of its memory-mapped files.
+
+    Returns:
+        Snapshot: A named tuple of the fundamentals, price panel,
+        ranking, number of companies removed from the ranking and the
+        time the snapshot was published.
+    """
+    index_dir = os.path.join(refresh_dir, index)
+    current = _read_current(index_dir)
+    if current is None:
+        return None
+    version_dir = os.path.join(index_dir, current["version"])
+    try:
+        return Snapshot(
+            read_table(os.path.join(version_dir, "fundamentals")),
+            PriceStore(os.path.join(version_dir, "prices")).panel(),
+            read_table(os.path.join(version_dir, "ranking")),
+            current["removed"],
+            current["refreshed"],
+        )
+    except FileNotFoundError:
+        # A refresh replaced the snapshot while it was being read
+        latest = _read_current(index_dir)
+        if latest and latest["version"] != current["version"]:
+            return load_snapshot(index, refresh_dir)
+        return None
+
+
+def get_snapshot(index, max_age=INTERVAL, refresh_dir=REFRESH_DIR):
+    """
+    Returns the snapshot of an index without waiting for a refresh
+    unless there is no snapshot at all.
+
+    A snapshot older than `max_age` seconds is still returned at once,
+    and a refresher process is started in the background so that the
+    next caller gets fresh data.
+
+    Args:
+        index (str): The index, one of the keys of `INDEX_URLS`.
+        max_age (float, optional): The age in seconds after which the
+        snapshot is refreshed.
+        refresh_dir (str, optional): The directory of the snapshots.
+
+    Returns:
+        Snapshot: The snapshot of the index.
+
+    Raises:
+        RuntimeError: If there is no snapshot and the index could not
+        be refreshed.
+    """
+    snapshot = load_snapshot(index, refresh_dir)
+    if snapshot is None:
+        snapshot = _first_snapshot(index, refresh_dir)
+    elif time.time() - snapshot.refreshed > max_age:
+        subprocess.Popen(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--once",
+                "--interval",
+                str(max_age),
+                index,
+            ],
+            env=dict(os.environ, INVESTIQ_REFRESH_DIR=refresh_dir),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    return snapshot
+
+
+def _first_snapshot(index, refresh_dir, attempts=2):
+    """
+    Refreshes an index that has no snapshot yet and returns its
+    snapshot, or waits for the process that is already refreshing it.
+    If that process's refresh fails, the index is refreshed here.
+    """
+    for _ in range(attempts):
+        try:
+            refreshed = refresh_index(index, refresh_dir)
+        except Exception as e:
+            raise RuntimeError(
+                f"the data of the {index} index could not be refreshed: {e}"
+            ) from e
+        if not refreshed:
+            # Another process is already refreshing it, so wait for it
+            with open(os.path.join(refresh_dir, index, ".lock")) as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+        snapshot = load_snapshot(index, refresh_dir)
+        if snapshot is not None:
+            return snapshot
+    raise RuntimeError(f"the data of the {index} index could not be refreshed")
+
+
+def run(indices, interval=INTERVAL, once=False, refresh_dir=REFRESH_DIR):
+    """
+    Refreshes every index whose snapshot is older than `interval`
+    seconds, then waits until the next one is due, forever unless
+    `once` is true.
+    """
+    while True:
+        next_due = interval
+        for index in indices:
+            current = _read_current(os.path.join(refresh_dir, index))
+            age = time.time() - current["refreshed"] if current else interval
+            if age < interval:
+                next_due = min(next_due, interval - age)
+                continue
+            started = time.perf_counter()
+            try:
+                refreshed = refresh_index(index, refresh_dir)
+            except Exception as e:
+                print(f"Failed to refresh {index}. Error: {e}")
+                continue
+            if refreshed:
+                print(
+                    f"Refreshed {index} in"
+                    f" {time.perf_counter() - started:.1f}s"
+                )
+        if once:
+            return
+        time.sleep(next_due)
+
+
+def _read_current(index_dir):
+    try:
+        with open(os.path.join(index_dir, CURRENT_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Keep the InvestIQ index data up to date."
+    )
+    parser.add_argument(
+        "indices", nargs="*", default=sorted(INDEX_URLS),
+        help="the indices to refresh, out of {}, all of them by default"
+        .format(", ".join(sorted(INDEX_URLS))),
+    )
+    parser.add_argument(
+        "--interval", type=float, default=INTERVAL,
+        help="the time in seconds between refreshes of an index",
+    )
+    parser.add_argument(
+        "--once", action="store_true",
+        help="refresh the out of date indices once and exit",
+    )
+    args = parser.parse_args()
+    unknown = set(args.indices) - set(INDEX_URLS)
+    if unknown:
+        parser.error(f"unknown indices: {', '.join(sorted(unknown))}")
+    run(args.indices, args.interval, args.once)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Mean and covariance estimates of daily returns that are updated one
+trading day at a time, so that a long-running deployment does not
+rebuild its risk model from the whole price window every day.
+"""
+import os
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from optimizer import RISK_FREE_RATE, RiskModel
+from price_cache import atomic_write
+
+# Trading days in the rolling window, a year as in the program
+WINDOW = 252
+# Trading days after which a day's weight in the exponentially
+# weighted estimates has halved
+HALFLIFE = 63
+# The estimates kept by OnlineCovariance
+ESTIMATES = ["rolling", "ewma"]
+
+
+class OnlineCovariance:
+    """
+    Rolling-window and exponentially weighted (EWMA) estimates of the
+    mean and covariance of daily returns, updated with each new day.
+
+    The rolling estimates keep the sum and the sum of outer products
+    of the returns in the window, so adding a day and dropping the
+    oldest one are two rank-one updates, O(n^2) for n stocks, instead
+    of recomputing the covariance over the whole window. To stop
+    rounding errors building up, the sums are recomputed from the
+    window of returns once per window, which is O(n^2) per day on
+    average. The rolling covariance equals the sample covariance of
+    the returns in the window, as used by `RiskModel`. The
+    exponentially weighted estimates are updated recursively,
+    starting from the first day's returns.
+
+    Like `RiskModel`, prices missing after a stock's first price are
+    filled with its last price, and days on which any stock has no
+    price yet are left out.
+
+    Args:
+        tickers (list): The stocks to estimate.
+        window (int, optional): The number of days in the rolling
+        window.
+        halflife (float, optional): The half-life in days of the
+        exponentially weighted estimates.
+    """
+
+    def __init__(self, tickers, window=WINDOW, halflife=HALFLIFE):
+        n = len(tickers)
+        self.tickers = list(tickers)
+        self.window = window
+        self.halflife = halflife
+        self.last_date = None
+        self.last_prices = np.full(n, np.nan)
+        self.count = 0
+        self.window_returns = np.zeros((window, n))
+        self.window_sum = np.zeros(n)
+        self.window_products = np.zeros((n, n))
+        self.ewma_mean = np.zeros(n)
+        self.ewma_cov = np.zeros((n, n))
+
+    @classmethod
+    def from_prices(cls, prices, window=WINDOW, halflife=HALFLIFE):
+        """Builds the estimates from a price panel."""
+        estimator = cls(prices.columns, window, halflife)
+        estimator.update_prices(prices)
+        return estimator
+
+    def update_prices(self, prices):
+        """
+        Adds the days of a price panel that are later than the last
+        day already added, so the same panel, or one overlapping the
+        days already added, can be passed again.
+
+        Args:
+            prices (pd.DataFrame): A price panel indexed by date with
+            a column for every stock of the estimator.
+
+        Returns:
+            int: The number of days of returns added.
+        """
+        prices = prices.sort_index()
+        if self.last_date is not None:
+            prices = prices.loc[prices.index > self.last_date]
+        values = prices.reindex(columns=self.tickers).to_numpy(dtype=float)
+        added = 0
+        for date, row in zip(prices.index, values):
+            added += self.update(date, row)
+        return added
+
+    def update(self, date, prices):
+        """
+        Adds one day of prices, in the order of `tickers`.
+
+        Returns:
+            bool: Whether a day of returns was added. The first day,
+            and days on which a stock has no price yet, only record
+            the prices.
+        """
+        prices = np.where(np.isnan(prices), self.last_prices, prices)
+        returns = prices / self.last_prices - 1
+        self.last_date = pd.Timestamp(date)
+        self.last_prices = prices
+        if np.isnan(returns).any():
+            return False
+
+        position = self.count % self.window
+        oldest = self.window_returns[position].copy()
+        self.window_returns[position] = returns
+        self.count += 1
+        if self.count % self.window == 0:
+            self.window_sum = self.window_returns.sum(axis=0)
+            self.window_products = self.window_returns.T @ self.window_returns
+        else:
+            self.window_sum += returns - oldest
+            self.window_products += (
+                np.outer(returns, returns) - np.outer(oldest, oldest)
+            )
+
+        if self.count == 1:
+            self.ewma_mean = returns.copy()
+        else:
+            decay = 0.5 ** (1 / self.halflife)
+            deviation = returns - self.ewma_mean
+            self.ewma_mean += (1 - decay) * deviation
+            self.ewma_cov = decay * (
+                self.ewma_cov
+                + (1 - decay) * np.outer(deviation, deviation)
+            )
+        return True
+
+    def mean(self, estimate="rolling"):
+        """
+        Returns the mean daily return of each stock, from the rolling
+        window or the exponentially weighted estimate.
+        """
+        if estimate == "ewma":
+            mean = self.ewma_mean
+        else:
+            mean = self.window_sum / self._window_days()
+        return pd.Series(mean, index=self.tickers)
+
+    def cov(self, estimate="rolling"):
+        """
+        Returns the daily covariance matrix of the returns, from the
+        rolling window or the exponentially weighted estimate.
+        """
+        if estimate == "ewma":
+            cov = self.ewma_cov
+        else:
+            days = self._window_days()
+            mean = self.window_sum / days
+            cov = (
+                self.window_products - days * np.outer(mean, mean)
+            ) / (days - 1)
+        return pd.DataFrame(cov, index=self.tickers, columns=self.tickers)
+
+    def _window_days(self):
+        if self.count < 2:
+            raise ValueError("at least two days of returns are needed")
+        return min(self.count, self.window)
+
+    def save(self, path):
+        """
+        Saves the estimates to a .npz file, replacing it atomically.
+        """
+        atomic_write(
+            path,
+            lambda f: np.savez(
+                f,
+                tickers=np.array(self.tickers),
+                window=self.window,
+                halflife=self.halflife,
+                last_date=np.datetime64(self.last_date or "NaT", "ns"),
+                last_prices=self.last_prices,
+                count=self.count,
+                window_returns=self.window_returns,
+                window_sum=self.window_sum,
+                window_products=self.window_products,
+                ewma_mean=self.ewma_mean,
+                ewma_cov=self.ewma_cov,
+            ),
+            mode="wb",
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Loads estimates saved with `save`."""
+        with np.load(path) as state:
+            estimator = cls(
+                state["tickers"].tolist(),
+                int(state["window"]),
+                float(state["halflife"]),
+            )
+            last_date = pd.Timestamp(state["last_date"][()])
+            estimator.last_date = None if pd.isna(last_date) else last_date
+            estimator.count = int(state["count"])
+            for name in [
+                "last_prices",
+                "window_returns",
+                "window_sum",
+                "window_products",
+                "ewma_mean",
+                "ewma_cov",
+            ]:
+                setattr(estimator, name, state[name])
+        return estimator
+
+
+def update_state(path, prices, window=WINDOW, halflife=HALFLIFE):
+    """
+    Brings the estimates saved at `path` up to date with a price
+    panel and saves them again. The estimates are built from the
+    whole panel when nothing is saved yet, or the saved estimates
+    are for different stocks.
+
+    Stocks with no price on the first day of the panel, because they
+    have no prices at all or were listed later, are left out of the
+    estimates, as each of them would otherwise leave out every day
+    before its first price.
+
+    Returns:
+        OnlineCovariance: The updated estimates.
+    """
+    priced = prices.sort_index().dropna(how="all")
+    tickers = (
+        priced.columns[priced.iloc[0].notna()] if len(priced)
+        else priced.columns
+    ).tolist()
+    estimator = None
+    if os.path.exists(path):
+        estimator = OnlineCovariance.load(path)
+        if estimator.tickers != tickers:
+            estimator = None
+    if estimator is None:
+        estimator = OnlineCovariance(tickers, window, halflife)
+    if estimator.update_prices(prices):
+        estimator.save(path)
+    return estimator
+
+
+class OnlineRiskModel(RiskModel):
+    """
+    A `RiskModel` whose mean and covariance come from the estimates of
+    an `OnlineCovariance` rather than from a price panel, so HRP
+    weights and performance can be calculated without recomputing
+    them. The methods that need the prices themselves
+    (`min_volatility` and `max_sharpe`) are not available.
+
+    Args:
+        estimator (OnlineCovariance): The estimates to use.
+        tickers (list, optional): The stocks of the model. Defaults to
+        every stock of the estimator.
+        estimate (str, optional): 'rolling' or 'ewma'.
+        risk_free_rate (float, optional): The annual risk-free rate
+        used for Sharpe ratios.
+    """
+
+    def __init__(
+        self,
+        estimator,
+        tickers=None,
+        estimate="rolling",
+        risk_free_rate=RISK_FREE_RATE,
+    ):
+        if estimate not in ESTIMATES:
+            raise ValueError(f"the estimate must be one of {ESTIMATES}")
+        super().__init__(None, risk_free_rate)
+        self.estimator = estimator
+        self.tickers = list(tickers or estimator.tickers)
+        self.estimate = estimate
+
+    @cached_property
+    def daily_mean(self):
+        return self.estimator.mean(self.estimate)[self.tickers]
+
+    @cached_property
+    def sample_cov(self):
+        return self.estimator.cov(self.estimate).loc[
+            self.tickers, self.tickers
+        ]
+
+    @cached_property
+    def corr(self):
+        std = np.sqrt(np.diag(self.sample_cov))
+        return self.sample_cov / np.outer(std, std)
@@ -1,10 +1,20 @@
-from pypfopt.discrete_allocation import DiscreteAllocation, get_latest_prices
-from utils import *
+import tracing
+from refresher import get_snapshot
+from utils import (
+    INDEX_URLS,
+    choose_companies,
+    combine_stocks,
+    fundamentals_information,
+    get_companies_list,
+    hpp_optimization,
+    reset_program,
+    typewriter,
+)
 
 
-def main():
+def main(session_data):
     """
-    Main function that runs the program
+    Main function that runs the program once
 
     This function handles the high-level logic of the program.
     It calls the functions that are responsible for the following:
@@ -14,19 +24,33 @@ def main():
     Ranking companies based on their fundamentals
     Generating a portfolio
     Calculating returns and volatility
+
+    The fundamentals, prices and ranking of each index are loaded
+    the first time the index is chosen and kept in `session_data`,
+    so running the program again in the same session does not
+    load anything.
+
+    Args:
+        session_data (dict): The fundamentals, price panel and
+        ranking loaded so far in the session, keyed by index.
     """
     # Step 1: Choosing Index
     # Function to pick index
     chosen_index = get_companies_list()
-    # Function to scrape tickers from chosen index
-    symbols = scrape_company_tickers(chosen_index)
-    # Function to scrape financial infromation from tickers that were scraped
-    fundamentals_data, symbols = collect_data(symbols)
+    if chosen_index not in session_data:
+        try:
+            session_data[chosen_index] = load_index_data(chosen_index)
+        except RuntimeError as e:
+            typewriter(f"Sorry, {e}. Please try again later.\n")
+            return
+    (
+        fundamentals_data,
+        price_panel,
+        fundamentals_percentile,
+        removed_companies,
+    ) = session_data[chosen_index]
 
     # Step 2: Choosing stocks
-    # Function to calculate quarterly returns from each stock from our index
-    fundamentals_data["quarterlyReturn"] = process_data(
-        fundamentals_data['symbol'])
     print("----------------------------------------------------")
     typewriter("Here are the fundamentals for your list of companies: \n")
     print("----------------------------------------------------")
@@ -34,42 +58,11 @@ def main():
     print("")
     # Function to provide information on each company stat / ratio
     fundamentals_information()
-    # Remove companies with missing data
-    fundamentals_data_dropna = fundamentals_data.dropna()
-    # Calculate the number companies with missing data
-    removed_companies = (
-        fundamentals_data["symbol"].count() -
-        fundamentals_data_dropna["symbol"].count()
-    )
-    # Calculate the percentiles for each company statistic / ratio
-    fundamentals_percentile = calculate_percentile_rank(
-        fundamentals_data_dropna[
-            [
-                "forwardPE",
-                "debtToEquity",
-                "forwardEps",
-                "returnOnEquity",
-                "returnOnAssets",
-                "revenueGrowth",
-                "quickRatio",
-                "quarterlyReturn",
-            ]
-        ]
-    )
-    fundamentals_percentile["symbols"] = symbols
-    fundamentals_percentile = fundamentals_percentile[
-        [
-            "symbols",
-            "forwardPE",
-            "debtToEquity",
-            "forwardEps",
-            "returnOnEquity",
-            "returnOnAssets",
-            "revenueGrowth",
-            "quickRatio",
-            "quarterlyReturn",
-        ]
-    ]
+    typewriter("------------------------------------\n")
+    typewriter("  Step 2: Ranking Your Companies       \n")
+    typewriter("------------------------------------\n")
+    # The companies were scored and ranked on their fundamentals by
+    # the refresher, with the `rank_companies` function
     typewriter("----------------------------------------------------\n")
     typewriter(
         "Here are your companies scored and ranked based \
@@ -79,25 +72,6 @@ on their fundamentals.\n"
 scores based on fundamentals.\n"
     )
     typewriter("----------------------------------------------------\n")
-    # Function to rank companies based on their fundamentals
-    rank_stocks(fundamentals_percentile)
-    # Function to sort companies based on their scores
-    fundamentals_percentile.sort_values("score", ascending=False, inplace=True)
-    fundamentals_percentile = fundamentals_percentile[
-        [
-            "symbols",
-            "score",
-            "forwardPE",
-            "debtToEquity",
-            "forwardEps",
-            "returnOnEquity",
-            "returnOnAssets",
-            "revenueGrowth",
-            "quickRatio",
-            "quarterlyReturn",
-        ]
-    ]
-    fundamentals_percentile = fundamentals_percentile.reset_index(drop=True)
     print(fundamentals_percentile)
     print("\n--------------------------------------------------------")
     print(
@@ -108,21 +82,67 @@ scores based on fundamentals.\n"
     # Step 3: Optimize Portfolio
     # Return the number of companies the user
     # wants to include in their portfolio
-    portfolio = choose_companies(fundamentals_percentile)
+    portfolio = choose_companies(fundamentals_percentile, price_panel)
     portfolio_stocks = portfolio["symbols"].tolist()
     # Return the historical closing prices for each stock in the portfolio
-    portfolio_prices = combine_stocks(portfolio_stocks)
+    portfolio_prices = combine_stocks(portfolio_stocks, price_panel)
+    from pypfopt.discrete_allocation import get_latest_prices
+
     latest_prices = get_latest_prices(portfolio_prices)
 
     # Step 4: Allocating Budget
     # Hierarchical Risk Parity Optimization(HRP)
     hpp_optimization(portfolio_prices, latest_prices)
-    reset_program()
-    main()
 
 
-typewriter(
-    """\
+@tracing.traced
+def load_index_data(chosen_index):
+    """
+    Loads the fundamentals, with each company's quarterly return,
+    a year of prices and the ranking of the companies in an index.
+
+    The data comes from the last snapshot published by the
+    refresher, so nothing is downloaded unless the index has never
+    been refreshed. An out of date snapshot is still used, and is
+    refreshed in the background for later sessions. The DataFrames
+    are read-only views of the snapshot's memory-mapped files, which
+    every session on the host shares.
+
+    Args:
+        chosen_index (str): The URL of the Wikipedia page of the index.
+
+    Returns:
+        pd.DataFrame: The fundamentals of the companies in the index.
+        pd.DataFrame: The price panel of the companies in the index.
+        pd.DataFrame: The companies ranked by `rank_companies`.
+        int: The number of companies removed from the ranking due to
+        missing data.
+
+    Raises:
+        RuntimeError: If the index has no snapshot and could not be
+        refreshed.
+    """
+    index_names = {url: name for name, url in INDEX_URLS.items()}
+    snapshot = get_snapshot(index_names[chosen_index])
+    return (
+        snapshot.fundamentals,
+        snapshot.prices,
+        snapshot.ranking,
+        snapshot.removed,
+    )
+
+
+def start():
+    """
+    Shows the welcome screen, which explains the four steps of
+    the program, then runs the program in a loop until the
+    session ends.
+
+    Each run of the program reuses the data that earlier runs
+    in the session have already loaded.
+    """
+    typewriter(
+        """\
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⣀⣠⣤⣤⣤⡀⠀⠀⠀⠀⠀⠀⠀⡤⠚⣉⠉⠲⡄⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⢀⣠⠶⠛⠉⠀⠀⢻⣿⣿⡀⠀⠀⠀⠀⠀⢸⠀⡞⠉⠙⠒⠃⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⢀⣴⣿⣿⣦⠀⠀⠀⠀⠀⢻⣿⣷⡄⠀⠀⠀⠀⠘⣄⠹⣄⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
@@ -153,39 +173,50 @@ typewriter(
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⡇⠀⠀⠀⠀⠁⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⢻⡀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
 ⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠻⠦⣤⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀\n""",
-    0.0025,
-)
-typewriter("------------------------------------\n")
-typewriter("         Welcome to InvestIQ!       \n")
-typewriter("------------------------------------\n")
-typewriter(
-    "InvestIQ helps you create the best possible\
+        0.0025,
+    )
+    typewriter("------------------------------------\n")
+    typewriter("         Welcome to InvestIQ!       \n")
+    typewriter("------------------------------------\n")
+    typewriter(
+        "InvestIQ helps you create the best possible\
  portfolio of stocks from US companies \n"
-)
-typewriter("InvestIQ uses live data to\
+    )
+    typewriter("InvestIQ uses live data to\
  create your portfolio \n")
-typewriter("InvestIQ does this in four steps\n")
-typewriter("Step 1: retrieving the group of\
+    typewriter("InvestIQ does this in four steps\n")
+    typewriter("Step 1: retrieving the group of\
  companies to use in your portfolio\n")
-typewriter("Step 2: ranking those companies using our algorithm\n")
-typewriter(
-    "Step 3: creating the optimal portfolio from\
+    typewriter("Step 2: ranking those companies using our algorithm\n")
+    typewriter(
+        "Step 3: creating the optimal portfolio from\
  these companies to maxmize your returns and minimize risk\n"
-)
-typewriter(
-    "Step 4: determining how many shares to buy\
+    )
+    typewriter(
+        "Step 4: determining how many shares to buy\
  in each company based on your budget\n"
-)
-typewriter("At the end of the program, you will be given three metrics\n")
-typewriter("1: Expected Annual Return\n")
-typewriter("2: Annual Volatility\n")
-typewriter("3: Sharpe Ratio\n")
-typewriter("Your goal is to get 1 & 3 as high\
+    )
+    typewriter("At the end of the program, you will be given three metrics\n")
+    typewriter("1: Expected Annual Return\n")
+    typewriter("2: Annual Volatility\n")
+    typewriter("3: Sharpe Ratio\n")
+    typewriter("Your goal is to get 1 & 3 as high\
  as possible and 2 as low as possible\n")
-while True:
-    typewriter("Press Enter to start.\n")
-    if input("\n") == "":
-        main()
-    else:
-        print("invalid input")
-        print("Press Enter on a blank line")
+    while True:
+        typewriter("Press Enter to start.\n")
+        if input("\n") == "":
+            break
+        else:
+            print("invalid input")
+            print("Press Enter on a blank line")
+
+    session_data = {}
+    while True:
+        with tracing.span("session"):
+            main(session_data)
+        tracing.write()
+        reset_program()
+
+
+if __name__ == "__main__":
+    start()
@@ -0,0 +1,141 @@
+"""
+Pre-warmed session server for the websocket terminal.
+
+The server imports the program and its heavy dependencies once and
+then listens on a Unix socket. For every connection it forks a child
+from this warm parent, gives the child a pseudo-terminal and runs the
+program on it, relaying bytes between the socket and the terminal.
+Sessions therefore start without paying any import cost, and the
+memory pages of the imported libraries are shared between sessions.
+
+Usage:
+    python session_server.py [socket path]
+"""
+import fcntl
+import gc
+import importlib
+import os
+import pty
+import select
+import signal
+import socket
+import struct
+import sys
+import termios
+
+SOCKET_PATH = os.environ.get(
+    "INVESTIQ_SESSION_SOCKET", "/tmp/investiq-session.sock"
+)
+# Modules that the program only imports once a step needs them,
+# loaded up front here so that no session has to wait for them
+PRELOAD_MODULES = [
+    "yfinance",
+    "pypfopt",
+    "pypfopt.discrete_allocation",
+    "pypfopt.hierarchical_portfolio",
+]
+# The terminal size used by the websocket terminal
+ROWS, COLS = 24, 80
+
+
+def serve(path=SOCKET_PATH):
+    """
+    Imports the program, then forks a session for every connection
+    to the Unix socket at `path` until the process is stopped.
+
+    Args:
+        path (str, optional): The path of the Unix socket.
+
+    Returns:
+        None
+    """
+    import run
+
+    for module in PRELOAD_MODULES:
+        importlib.import_module(module)
+    # Keep the warm objects out of the garbage collector, so that
+    # collections in the sessions do not copy the shared pages
+    gc.freeze()
+    # Children are reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen()
+    print(f"Session server listening on {path}", flush=True)
+
+    while True:
+        conn, _ = server.accept()
+        if os.fork() == 0:
+            server.close()
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            try:
+                run_session(conn, run.start)
+            finally:
+                os._exit(0)
+        conn.close()
+
+
+def run_session(conn, program):
+    """
+    Runs `program` on a new pseudo-terminal and relays its input
+    and output through the connection until either side closes.
+
+    Args:
+        conn (socket.socket): The connection of the session.
+        program (callable): The function that runs the program.
+
+    Returns:
+        None
+    """
+    pid, master = pty.fork()
+    if pid == 0:
+        conn.close()
+        os.environ["TERM"] = "xterm-color"
+        # The server's output was not a terminal, so stdout was
+        # opened block buffered
+        sys.stdout.reconfigure(line_buffering=True)
+        try:
+            program()
+        finally:
+            os._exit(0)
+
+    fcntl.ioctl(
+        master, termios.TIOCSWINSZ, struct.pack("HHHH", ROWS, COLS, 0, 0)
+    )
+    try:
+        relay(conn, master)
+    finally:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        os.close(master)
+        conn.close()
+
+
+def relay(conn, master):
+    """
+    Copies bytes between the connection and the terminal until
+    either of them is closed.
+    """
+    while True:
+        readable, _, _ = select.select([conn, master], [], [])
+        if conn in readable:
+            data = conn.recv(4096)
+            if not data:
+                return
+            os.write(master, data)
+        if master in readable:
+            try:
+                data = os.read(master, 4096)
+            except OSError:
+                # The terminal is closed once the program exits
+                return
+            if not data:
+                return
+            conn.sendall(data)
+
+
+if __name__ == "__main__":
+    serve(*sys.argv[1:])
@@ -0,0 +1,86 @@
+"""
+Tables shared read-only between processes through memory-mapped
+files.
+
+A table's floating point columns are kept as one NumPy array file in
+column-major order, and its other columns (the ticker symbols and any
+integer columns) in a small metadata file. Every process that reads
+the table maps the same array file, so the operating system keeps one
+copy of the values in its file cache for all of them, however many
+sessions are running.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from price_cache import atomic_write
+
+# The metadata of a table: its columns, in order, and the values of
+# the columns that are not floating point
+META_FILE = "meta.json"
+# The floating point columns of a table, of shape (rows, columns)
+VALUES_FILE = "values.npy"
+
+
+def write_table(path, frame):
+    """
+    Writes a DataFrame to a directory as a shared table. The index
+    is not kept.
+
+    Args:
+        path (str): The directory of the table.
+        frame (pd.DataFrame): The table, with columns of numbers and
+        strings.
+    """
+    os.makedirs(path, exist_ok=True)
+    floating = frame.select_dtypes("floating").columns
+    atomic_write(
+        os.path.join(path, VALUES_FILE),
+        lambda f: np.save(
+            f, np.asfortranarray(frame[floating].to_numpy(dtype=np.float64))
+        ),
+        mode="wb",
+    )
+    atomic_write(
+        os.path.join(path, META_FILE),
+        lambda f: json.dump(
+            {
+                "columns": frame.columns.tolist(),
+                "floating": floating.tolist(),
+                "other": {
+                    column: frame[column].tolist()
+                    for column in frame.columns.difference(floating)
+                },
+            },
+            f,
+        ),
+    )
+
+
+def read_table(path):
+    """
+    Maps a table written with `write_table`.
+
+    The floating point columns of the returned DataFrame are a
+    read-only view of the mapped file, so reading a table copies none
+    of their values. Operations that change the values in place raise
+    an error; ones that return a new DataFrame, such as `dropna` or
+    arithmetic, work as usual.
+
+    Args:
+        path (str): The directory of the table.
+
+    Returns:
+        pd.DataFrame: The table, with its columns in their original
+        order.
+    """
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    values = np.load(os.path.join(path, VALUES_FILE), mmap_mode="r")
+    frame = pd.DataFrame(values, columns=meta["floating"], copy=False)
+    for position, column in enumerate(meta["columns"]):
+        if column in meta["other"]:
+            frame.insert(position, column, meta["other"][column])
+    return frame
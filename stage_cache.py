@@ -0,0 +1,252 @@
+"""
+A content-addressed cache of the results of the pipeline's stages.
+
+Each result is stored under a hash of the stage's name and the
+content of its inputs, so a stage whose inputs are the same as in an
+earlier run is not computed again, and changing one input or
+parameter only recomputes the stages that it flows into. Results are
+kept in an in-memory LRU tier for the life of the process and in an
+on-disk tier shared by every run, each evicting its least recently
+used results once it grows past its size limit.
+
+The fingerprint of a result is recorded when it is stored, so passing
+it on to the next stage does not hash it again. Results are returned
+as they were stored, without a copy, so they must not be modified in
+place.
+"""
+import collections
+import datetime as dt
+import hashlib
+import os
+import pickle
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from price_cache import atomic_write
+
+# Directory of the on-disk tier, one pickle file per result
+CACHE_DIR = os.environ.get("INVESTIQ_STAGE_CACHE", "stage_cache")
+# The size limits of the two tiers, in bytes of pickled results
+MEMORY_BYTES = int(os.environ.get("INVESTIQ_STAGE_MEMORY", 256 * 2 ** 20))
+DISK_BYTES = int(os.environ.get("INVESTIQ_STAGE_DISK", 2 * 2 ** 30))
+
+# The fingerprints of results handed out by a cache, by object id
+_fingerprints = {}
+
+
+def fingerprint(value):
+    """
+    Returns a hash of the content of a value: a DataFrame, Series,
+    array, or a list, tuple or dict of them and of plain values.
+
+    Equal values get the same fingerprint, whether or not they were
+    handed out by a cache, whose recorded fingerprints are only a
+    shortcut for hashing their content again.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest of the value.
+    """
+    known = _fingerprints.get(id(value))
+    if known is not None and known[0]() is value:
+        return known[1]
+    digest = hashlib.sha256()
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        _hash_content(digest, value)
+    else:
+        _hash(digest, value)
+    return digest.hexdigest()
+
+
+def _hash_content(digest, value):
+    digest.update(type(value).__name__.encode())
+    if isinstance(value, np.ndarray):
+        digest.update(repr((value.dtype.str, value.shape)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+        return
+    names = value.columns if isinstance(value, pd.DataFrame) else [
+        value.name
+    ]
+    digest.update(repr(list(names)).encode())
+    digest.update(repr(value.dtypes).encode())
+    digest.update(
+        pd.util.hash_pandas_object(value.index).to_numpy().tobytes()
+    )
+    digest.update(
+        pd.util.hash_pandas_object(value, index=False).to_numpy().tobytes()
+    )
+
+
+def _hash(digest, value):
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        # Tables and arrays are represented by their own fingerprint,
+        # so a recorded one is used in place of hashing them again
+        digest.update(fingerprint(value).encode())
+        return
+    digest.update(type(value).__name__.encode())
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _hash(digest, key)
+            _hash(digest, item)
+    elif isinstance(value, (list, tuple)):
+        digest.update(str(len(value)).encode())
+        for item in value:
+            _hash(digest, item)
+    elif value is None or isinstance(
+        value, (str, bytes, int, float, dt.date, pd.Timestamp)
+    ):
+        digest.update(repr(value).encode())
+    else:
+        digest.update(pickle.dumps(value))
+
+
+def _remember(value, digest):
+    """Records the fingerprint of a result handed out by a cache."""
+    key = id(value)
+    try:
+        reference = weakref.ref(value, lambda _: _fingerprints.pop(key, None))
+    except TypeError:
+        # Plain lists and dicts cannot be weakly referenced; they are
+        # hashed again whenever they are used
+        return
+    _fingerprints[key] = (reference, digest)
+
+
+class StageCache:
+    """
+    Results of pipeline stages, keyed by the content of their inputs,
+    in memory and on disk.
+
+    Args:
+        cache_dir (str, optional): The directory of the on-disk tier,
+        or None to keep results in memory only.
+        memory_bytes (int, optional): The size limit of the memory
+        tier.
+        disk_bytes (int, optional): The size limit of the disk tier.
+    """
+
+    def __init__(
+        self,
+        cache_dir=CACHE_DIR,
+        memory_bytes=MEMORY_BYTES,
+        disk_bytes=DISK_BYTES,
+    ):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory = collections.OrderedDict()
+        self._memory_size = 0
+        self.counts = collections.defaultdict(collections.Counter)
+
+    def run(self, stage, function, *args, **kwargs):
+        """
+        Returns the result of `function(*args, **kwargs)`, computing it
+        only if the stage has not been run on the same inputs before.
+
+        Args:
+            stage (str): The name of the stage, part of the key, so
+            stages with the same inputs do not share results. The
+            function itself is not part of the key, so a stage whose
+            calculation changes needs a new name.
+            function (callable): The function of the stage. Its result
+            must depend only on its arguments.
+
+        Returns:
+            The result of the stage. A tuple result is returned as a
+            tuple, with each of its items fingerprinted separately.
+        """
+        key = fingerprint((stage, args, kwargs))
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.counts[stage]["memory_hits"] += 1
+            return self._memory[key][0]
+
+        data = self._read(key)
+        if data is not None:
+            self.counts[stage]["disk_hits"] += 1
+            entry = pickle.loads(data)
+        else:
+            self.counts[stage]["misses"] += 1
+            value = function(*args, **kwargs)
+            items = value if isinstance(value, tuple) else ()
+            entry = (
+                value,
+                fingerprint(value),
+                [fingerprint(item) for item in items],
+            )
+            data = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+            self._write(key, data)
+
+        value, digest, item_digests = entry
+        _remember(value, digest)
+        if isinstance(value, tuple):
+            for item, item_digest in zip(value, item_digests):
+                _remember(item, item_digest)
+        self._memory[key] = (value, len(data))
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes and len(self._memory) > 1:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_size -= evicted_size
+        return value
+
+    def stats(self):
+        """
+        Returns the memory hits, disk hits and misses of each stage.
+
+        Returns:
+            pd.DataFrame: The counts (columns) of each stage (rows).
+        """
+        return pd.DataFrame.from_dict(
+            self.counts, orient="index",
+            columns=["memory_hits", "disk_hits", "misses"],
+        ).fillna(0).astype(int)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".pkl")
+
+    def _read(self, key):
+        if self.cache_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # Mark the result as recently used for the eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def _write(self, key, data):
+        if self.cache_dir is None:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, lambda f: f.write(data), mode="wb")
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """
+        Removes the least recently used results until the disk tier
+        is within its size limit.
+        """
+        files = []
+        for directory in os.scandir(self.cache_dir):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The modules of the program are at the root of the repository
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def fundamentals():
+    """
+    The fundamentals of 200 companies with ties in every factor, three
+    missing factor values and two missing sectors.
+    """
+    from ranking import FACTORS
+
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(
+        rng.integers(0, 5, size=(200, len(FACTORS))).astype(float),
+        columns=FACTORS,
+    )
+    data.insert(0, "symbol", [f"S{i:03d}" for i in range(200)])
+    data["sector"] = "Industrials"
+    data.loc[[3, 17], "forwardPE"] = np.nan
+    data.loc[7, "quickRatio"] = np.nan
+    data.loc[[5, 17], "sector"] = None
+    return data
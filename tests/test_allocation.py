@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from allocation import BUDGETS, allocate_many
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_rounding_matches_greedy(seed):
+    rng = np.random.default_rng(seed)
+    tickers = [f"T{i}" for i in range(10)]
+    weights = dict(zip(tickers, rng.dirichlet(np.ones(len(tickers)))))
+    prices = pd.Series(rng.uniform(20, 600, len(tickers)), index=tickers)
+
+    shares, leftover = allocate_many(weights, prices, BUDGETS, "rounding")
+    greedy_shares, greedy_leftover = allocate_many(
+        weights, prices, BUDGETS, "greedy"
+    )
+
+    pd.testing.assert_frame_equal(shares, greedy_shares)
+    pd.testing.assert_series_equal(leftover, greedy_leftover)
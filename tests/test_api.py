@@ -0,0 +1,121 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from api import ApiService, handle_connection
+from ranking import FACTORS
+
+
+def _post_ranking(body):
+    status, payload = asyncio.run(
+        ApiService().handle("POST", "/ranking", json.dumps(body).encode())
+    )
+    return status, json.loads(payload)
+
+
+def _record(i):
+    return dict({"symbol": f"S{i}"}, **{f: float(i % 7) for f in FACTORS})
+
+
+def test_post_ranking_ranks_the_records():
+    status, results = _post_ranking({"fundamentals": [
+        _record(i) for i in range(10)
+    ]})
+
+    assert status == 200
+    assert len(results["ranking"]) == 10
+
+
+@pytest.mark.parametrize("body", [
+    {"fundamentals": [1, 2]},
+    {"fundamentals": [{"forwardPE": 1.0}]},
+    {"fundamentals": {"symbol": "S1"}},
+    {"fundamentals": [dict(_record(1), forwardPE="high")]},
+    [],
+])
+def test_post_ranking_rejects_malformed_records(body):
+    status, results = _post_ranking(body)
+
+    assert status == 400
+    assert "error" in results
+
+
+def test_internal_errors_are_not_client_errors(monkeypatch):
+    service = ApiService()
+
+    def index_ranking(index):
+        raise KeyError("symbols")
+
+    monkeypatch.setattr(service, "index_ranking", index_ranking)
+    status, _ = asyncio.run(service.handle("GET", "/ranking?index=dow", b""))
+
+    assert status == 500
+
+
+def test_identical_concurrent_requests_are_computed_once(monkeypatch):
+    service = ApiService()
+    computations = []
+
+    def index_ranking(index):
+        computations.append(threading.get_ident())
+        time.sleep(0.2)
+        return json.dumps({"index": index, "call": len(computations)})
+
+    monkeypatch.setattr(service, "index_ranking", index_ranking)
+
+    async def requests():
+        return await asyncio.gather(*[
+            service.handle("GET", "/ranking?index=dow", b"")
+            for _ in range(10)
+        ])
+
+    responses = asyncio.run(requests())
+
+    assert len(computations) == 1
+    assert {response for response in responses} == {
+        (200, '{"index": "dow", "call": 1}')
+    }
+    assert (service.flights.calls, service.flights.shared) == (1, 9)
+
+
+def _exchange(request):
+    """Sends raw bytes to a served connection and returns the reply."""
+
+    async def exchange():
+        server = await asyncio.start_server(
+            lambda reader, writer: handle_connection(
+                ApiService(), reader, writer
+            ),
+            "127.0.0.1",
+            0,
+        )
+        async with server:
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(request)
+            await writer.drain()
+            reply = await reader.read()
+            writer.close()
+            return reply
+
+    return asyncio.run(exchange())
+
+
+@pytest.mark.parametrize("request_bytes", [
+    b"POST /ranking HTTP/1.1\r\nContent-Length: -5\r\n\r\n",
+    b"GET /health HTTP/1.1\r\nX-Long: " + b"a" * 100000 + b"\r\n\r\n",
+    b"GET\r\n\r\n",
+], ids=["negative-length", "long-header", "short-request-line"])
+def test_malformed_requests_get_400(request_bytes):
+    reply = _exchange(request_bytes)
+
+    assert reply.startswith(b"HTTP/1.1 400 Bad Request")
+
+
+def test_health_over_a_connection():
+    reply = _exchange(b"GET /health HTTP/1.1\r\nConnection: close\r\n\r\n")
+
+    assert reply.startswith(b"HTTP/1.1 200 OK")
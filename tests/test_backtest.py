@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import run_backtest
+from ranking import FACTORS
+
+
+@pytest.fixture
+def offline():
+    """A price panel and fundamentals history of 10 random companies."""
+    rng = np.random.default_rng(3)
+    dates = pd.bdate_range("2019-01-01", periods=700)
+    symbols = [f"S{i}" for i in range(10)]
+    returns = rng.normal(0.0004, 0.015, size=(len(dates), len(symbols)))
+    prices = pd.DataFrame(
+        100 * np.cumprod(1 + returns, axis=0), index=dates, columns=symbols
+    )
+    # A company listed after the backtest starts
+    prices.loc[:dates[400], "S9"] = np.nan
+
+    known = pd.date_range("2018-12-31", dates[-1], freq="Q")
+    fundamentals = pd.DataFrame(
+        rng.normal(size=(len(known) * len(symbols), len(FACTORS))),
+        columns=FACTORS,
+    )
+    fundamentals.insert(0, "symbol", symbols * len(known))
+    fundamentals.insert(0, "date", np.repeat(known, len(symbols)))
+    return prices, fundamentals
+
+
+def _simulate(prices, targets, cost):
+    """Holds shares day by day, trading to `targets` on their dates."""
+    prices = prices.ffill().fillna(0.0)
+    shares = pd.Series(0.0, index=prices.columns)
+    cash = 1.0
+    equity = []
+    for date, price in prices.iterrows():
+        value = cash + (shares * price).sum()
+        equity.append(value)
+        if date not in targets.index:
+            continue
+        target = targets.loc[date]
+        before = shares * price / value
+        turnover = 0.5 * (
+            (target - before).abs().sum()
+            + abs((1 - target.sum()) - cash / value)
+        )
+        value *= 1 - cost * turnover
+        held = target > 0
+        shares = pd.Series(0.0, index=prices.columns)
+        shares[held] = target[held] * value / price[held]
+        cash = (1 - target.sum()) * value
+    return pd.Series(equity, index=prices.index)
+
+
+@pytest.mark.parametrize("cost", [0.0, 0.002])
+def test_equity_matches_a_day_by_day_simulation(offline, cost):
+    prices, fundamentals = offline
+
+    result = run_backtest(
+        prices, fundamentals, size=4, lookback=126, cost=cost
+    )
+
+    assert len(result.weights) >= 4
+    np.testing.assert_allclose(result.weights.sum(axis=1), 1.0)
+    assert ((result.weights > 0).sum(axis=1) == 4).all()
+    np.testing.assert_allclose(
+        result.equity, _simulate(prices, result.weights, cost)
+    )
+
+
+def test_late_listed_company_is_held_only_with_a_full_lookback(offline):
+    prices, fundamentals = offline
+    listed = prices["S9"].first_valid_index()
+
+    result = run_backtest(prices, fundamentals, size=9, lookback=126)
+
+    held = result.weights.index[result.weights["S9"] > 0]
+    assert len(held) > 0
+    assert (prices.index.get_indexer(held)
+            - prices.index.get_loc(listed) >= 126).all()
+
+
+@pytest.mark.parametrize("size", [0, 1])
+def test_size_below_two_is_rejected(offline, size):
+    prices, fundamentals = offline
+
+    with pytest.raises(ValueError):
+        run_backtest(prices, fundamentals, size=size)
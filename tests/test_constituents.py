@@ -0,0 +1,27 @@
+import pandas as pd
+import pytest
+
+import constituents
+
+
+def _failing_scrape(url):
+    raise ConnectionError("Wikipedia is unreachable")
+
+
+def test_failed_scrape_falls_back_to_the_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(constituents, "scrape_constituents", _failing_scrape)
+
+    symbols = constituents.get_constituents("dow", cache_dir=str(tmp_path))
+
+    assert isinstance(symbols, pd.Series)
+    assert len(symbols) == 30
+
+
+def test_failed_scrape_without_a_saved_list_is_reported(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setattr(constituents, "scrape_constituents", _failing_scrape)
+
+    with pytest.raises(RuntimeError, match="unreachable") as error:
+        constituents.get_constituents("sp500", cache_dir=str(tmp_path))
+    assert isinstance(error.value.__cause__, ConnectionError)
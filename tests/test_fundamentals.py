@@ -0,0 +1,89 @@
+import threading
+
+from fundamentals import FUNDAMENTALS, fetch_fundamentals
+
+
+class StubProvider:
+    """
+    Serves made-up fundamentals locally, failing the first
+    `failures` requests of each symbol listed in `flaky` and every
+    request of the symbols listed in `down`.
+    """
+
+    def __init__(self, flaky=(), down=(), failures=1):
+        self.flaky = set(flaky)
+        self.down = set(down)
+        self.failures = failures
+        self.requests = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, symbol):
+        with self.lock:
+            self.requests[symbol] = self.requests.get(symbol, 0) + 1
+            count = self.requests[symbol]
+        if symbol in self.down:
+            raise ConnectionError(f"{symbol} is unavailable")
+        if symbol in self.flaky and count <= self.failures:
+            raise ConnectionError("too many requests")
+        info = {field: float(len(symbol)) for field in FUNDAMENTALS}
+        # A field the provider does not return, and one it returns as
+        # text, are both left as NaN
+        del info["quickRatio"]
+        info["dividendYield"] = "n/a"
+        return info
+
+
+def _fetch(symbols, provider, **options):
+    options = dict(dict(rate=1000.0, backoff=0.0), **options)
+    return fetch_fundamentals(symbols, provider, **options)
+
+
+def test_fetch_fundamentals_keeps_the_order_of_symbols():
+    symbols = [f"S{i}" * (i % 3 + 1) for i in range(20)]
+
+    data, failures = _fetch(symbols, StubProvider())
+
+    assert failures == {}
+    assert data["symbol"].tolist() == symbols
+    assert data.columns.tolist() == ["symbol"] + FUNDAMENTALS
+    assert data["marketCap"].tolist() == [len(s) for s in symbols]
+    assert data["quickRatio"].isna().all()
+    assert data["dividendYield"].isna().all()
+
+
+def test_fetch_fundamentals_retries_failed_requests():
+    provider = StubProvider(flaky=["AAA", "BBB"], failures=2)
+
+    data, failures = _fetch(["AAA", "BBB", "CCC"], provider, retries=2)
+
+    assert failures == {}
+    assert data["symbol"].tolist() == ["AAA", "BBB", "CCC"]
+    assert provider.requests == {"AAA": 3, "BBB": 3, "CCC": 1}
+
+
+def test_fetch_fundamentals_reports_companies_out_of_retries():
+    provider = StubProvider(flaky=["AAA"], down=["BBB"], failures=5)
+
+    data, failures = _fetch(["AAA", "BBB", "CCC"], provider, retries=1)
+
+    assert data["symbol"].tolist() == ["CCC"]
+    assert failures == {
+        "AAA": "too many requests",
+        "BBB": "BBB is unavailable",
+    }
+    assert provider.requests == {"AAA": 2, "BBB": 2, "CCC": 1}
+
+
+def test_fetch_fundamentals_skips_the_rest_after_max_failures():
+    symbols = [f"S{i:02d}" for i in range(30)]
+    provider = StubProvider(down=symbols[:5])
+
+    data, failures = _fetch(
+        symbols, provider, max_workers=1, retries=0, max_failures=3
+    )
+
+    assert data.empty
+    assert len(failures) == 30
+    assert list(provider.requests) == symbols[:3]
+    skipped = [s for s, error in failures.items() if "skipped" in error]
+    assert skipped == symbols[3:]
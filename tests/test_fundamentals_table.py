@@ -0,0 +1,28 @@
+import numpy as np
+
+from fundamentals_table import FundamentalsTable, rank_table
+from ranking import FACTORS
+from utils import rank_companies
+
+
+def test_rank_table_matches_rank_companies(fundamentals):
+    data = fundamentals
+    ranking, removed = rank_companies(data)
+
+    table, table_removed = rank_table(FundamentalsTable.from_frame(data))
+
+    assert table_removed == removed == 4
+    assert list(table.symbols) == ranking["symbols"].tolist()
+    np.testing.assert_allclose(
+        table.to_frame("symbols")[["score"] + FACTORS],
+        ranking[["score"] + FACTORS],
+        atol=1e-4,
+    )
+
+
+def test_select_of_consecutive_columns_is_a_view(fundamentals):
+    table = FundamentalsTable.from_frame(fundamentals)
+
+    selected = table.select(FACTORS[:3])
+
+    assert np.shares_memory(selected.values, table.values)
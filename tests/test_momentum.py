@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from momentum import horizon_returns
+
+
+@pytest.fixture
+def prices():
+    """Business-day prices that rise by 1 a day, one ticker listed late."""
+    dates = pd.bdate_range("2020-06-01", "2021-12-31")
+    panel = pd.DataFrame(
+        {"A": np.arange(100.0, 100.0 + len(dates))}, index=dates
+    )
+    panel["B"] = panel["A"] * 2
+    panel.loc[:"2021-02-14", "B"] = np.nan
+    return panel
+
+
+def _quarter_return(prices, start, end):
+    return prices.loc[end] / prices.loc[start] - 1
+
+
+def test_as_of_a_quarter_end_uses_the_quarter_that_ends_that_day(prices):
+    returns = horizon_returns(prices, "2021-03-31")
+
+    assert returns.loc["A", "quarterlyReturn"] == pytest.approx(
+        _quarter_return(prices["A"], "2020-12-31", "2021-03-31")
+    )
+
+
+def test_mid_quarter_uses_the_last_completed_quarter(prices):
+    returns = horizon_returns(prices, "2021-05-14")
+
+    assert returns.loc["A", "quarterlyReturn"] == pytest.approx(
+        _quarter_return(prices["A"], "2020-12-31", "2021-03-31")
+    )
+    # Prices after the as-of date are not used
+    assert returns.loc["A", "1M"] == pytest.approx(
+        _quarter_return(prices["A"], "2021-04-14", "2021-05-14")
+    )
+
+
+def test_ticker_listed_after_the_quarter_start_has_no_return(prices):
+    during = horizon_returns(prices, "2021-05-14")
+    after = horizon_returns(prices, "2021-08-16")
+
+    assert np.isnan(during.loc["B", "quarterlyReturn"])
+    assert np.isnan(during.loc["B", "6M"])
+    assert during.loc["B", "1M"] == pytest.approx(
+        _quarter_return(prices["B"], "2021-04-14", "2021-05-14")
+    )
+    assert after.loc["B", "quarterlyReturn"] == pytest.approx(
+        _quarter_return(prices["B"], "2021-03-31", "2021-06-30")
+    )
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from price_cache import cached_price_panel
+
+DATES = pd.bdate_range("2024-01-01", "2024-03-29")
+
+
+class FakeProvider:
+    """
+    Serves adjusted close prices and records the windows it is asked
+    for.
+    """
+
+    def __init__(self):
+        self.adjusted = pd.DataFrame(
+            {"AAA": np.linspace(100, 120, len(DATES)), "BBB": 50.0},
+            index=DATES,
+        )
+        self.calls = []
+
+    def __call__(self, tickers, start, end):
+        self.calls.append((sorted(tickers), start, end))
+        return self.adjusted.loc[start:end - pd.Timedelta(days=1), tickers]
+
+
+def test_cache_only_fetches_new_days(tmp_path):
+    provider = FakeProvider()
+    start = pd.Timestamp("2024-01-01")
+    cached_price_panel(
+        ["AAA", "BBB"], start, pd.Timestamp("2024-03-01"), provider,
+        str(tmp_path),
+    )
+
+    panel = cached_price_panel(
+        ["AAA", "BBB"], start, pd.Timestamp("2024-03-30"), provider,
+        str(tmp_path),
+    )
+
+    assert len(provider.calls) == 2
+    assert provider.calls[1][1] > start
+    pd.testing.assert_frame_equal(
+        panel, provider.adjusted, check_freq=False, check_names=False
+    )
+
+
+def test_cache_refetches_tickers_adjusted_since_they_were_cached(tmp_path):
+    provider = FakeProvider()
+    start = pd.Timestamp("2024-01-01")
+    cached_price_panel(
+        ["AAA", "BBB"], start, pd.Timestamp("2024-03-01"), provider,
+        str(tmp_path),
+    )
+    # AAA pays a dividend, which lowers every adjusted price before it
+    provider.adjusted.loc[:"2024-03-14", "AAA"] *= 0.98
+
+    panel = cached_price_panel(
+        ["AAA", "BBB"], start, pd.Timestamp("2024-03-30"), provider,
+        str(tmp_path),
+    )
+
+    assert provider.calls[-1] == (["AAA"], start, pd.Timestamp("2024-03-30"))
+    pd.testing.assert_frame_equal(
+        panel, provider.adjusted, check_freq=False, check_names=False
+    )
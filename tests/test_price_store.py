@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+import price_store
+from price_store import PriceStore, write_store
+
+
+def _panel(offset):
+    return pd.DataFrame(
+        np.arange(12.0).reshape(4, 3) + offset,
+        index=pd.bdate_range("2024-01-02", periods=4),
+        columns=["AAA", "BBB", "CCC"],
+    )
+
+
+def test_store_opens_the_version_it_read(tmp_path):
+    write_store(str(tmp_path), {"close": _panel(0)})
+    write_store(str(tmp_path), {"close": _panel(1)})
+
+    pd.testing.assert_frame_equal(
+        PriceStore(str(tmp_path)).panel(), _panel(1), check_names=False,
+        check_freq=False,
+    )
+    # The version replaced is kept for readers that read its metadata
+    assert len(list(tmp_path.glob("close.*.npy"))) == 2
+
+
+def test_store_retries_when_its_version_is_removed(tmp_path, monkeypatch):
+    path = str(tmp_path)
+    write_store(path, {"close": _panel(0)})
+    stale = price_store._read_meta(path)
+    write_store(path, {"close": _panel(1)})
+    write_store(path, {"close": _panel(2)})
+
+    read_meta = price_store._read_meta
+    metas = [stale]
+    monkeypatch.setattr(
+        price_store,
+        "_read_meta",
+        lambda path: metas.pop() if metas else read_meta(path),
+    )
+
+    store = PriceStore(path)
+    assert store.panel().iloc[0].tolist() == [2.0, 3.0, 4.0]
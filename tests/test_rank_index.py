@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from rank_index import RankIndex
+from ranking import FACTORS
+from utils import rank_companies
+
+
+def test_table_has_the_percentiles_of_rank_companies(fundamentals):
+    data = fundamentals
+    ranking, removed = rank_companies(data)
+
+    table, table_removed = RankIndex.from_frame(data).table()
+
+    assert table_removed == removed == 4
+    expected = ranking.set_index("symbols").loc[table["symbols"]]
+    np.testing.assert_array_equal(table[FACTORS], expected[FACTORS])
+    np.testing.assert_allclose(table["score"], expected["score"])
+
+
+def test_table_lists_ties_in_the_order_they_were_added(fundamentals):
+    data = fundamentals
+    position = {symbol: i for i, symbol in enumerate(data["symbol"])}
+
+    table, _ = RankIndex.from_frame(data).table()
+
+    order = pd.DataFrame({
+        "score": -table["score"].round(8),
+        "position": table["symbols"].map(position),
+    })
+    assert order.equals(order.sort_values(["score", "position"]))
+
+
+def test_updates_match_ranking_again(fundamentals):
+    data = fundamentals
+    index = RankIndex.from_frame(data)
+    data.loc[3, FACTORS] = 4.0
+    index.update("S003", data.loc[3])
+    index.remove("S010")
+    data = data.drop(index=10)
+
+    ranking, _ = rank_companies(data)
+    table, _ = index.table()
+
+    expected = ranking.set_index("symbols").loc[table["symbols"]]
+    np.testing.assert_array_equal(table[FACTORS], expected[FACTORS])
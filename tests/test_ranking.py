@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import percentileofscore
+
+from ranking import (
+    FACTOR_WEIGHTS,
+    FACTORS,
+    INVERSE_FACTORS,
+    percentile_rank,
+    rank_orders,
+    score_stocks,
+)
+
+
+def _loop_percentile_rank(df):
+    """The percentile ranks as the loop over every value computed them."""
+    ranked = df.apply(
+        lambda column: column.apply(
+            lambda value: percentileofscore(column, value, "rank")
+        )
+    )
+    for column in INVERSE_FACTORS:
+        if column in ranked:
+            ranked[column] = 100 - ranked[column]
+    return ranked.round(2)
+
+
+@pytest.mark.parametrize("companies", [1, 2, 7, 30, 101])
+def test_percentile_rank_matches_percentileofscore(companies):
+    rng = np.random.default_rng(companies)
+    df = pd.DataFrame(
+        {
+            # Few distinct values, so most of them are tied
+            "forwardPE": rng.integers(0, 4, companies).astype(float),
+            "debtToEquity": rng.normal(size=companies),
+            "returnOnEquity": rng.choice([0.1, 0.2, 0.1 + 0.2], companies),
+            "quickRatio": np.full(companies, 1.5),
+        },
+        index=rng.permutation(companies) + 100,
+    )
+
+    pd.testing.assert_frame_equal(
+        percentile_rank(df), _loop_percentile_rank(df)
+    )
+
+
+def test_percentile_rank_of_a_column_with_nan():
+    df = pd.DataFrame({
+        "forwardPE": [1.0, np.nan, 3.0, 3.0],
+        "returnOnEquity": [2.0, 2.0, 1.0, 4.0],
+    })
+
+    ranked = percentile_rank(df)
+
+    # scipy gives no ranks to a column that has a missing value
+    assert ranked["forwardPE"].isna().all()
+    pd.testing.assert_frame_equal(ranked, _loop_percentile_rank(df))
+
+
+def _percentiles(companies=25, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        rng.uniform(0, 100, size=(companies, len(FACTORS))),
+        columns=FACTORS,
+        index=[f"S{i:02d}" for i in range(companies)],
+    )
+
+
+def test_score_stocks_with_many_weight_sets():
+    df = _percentiles()
+    rng = np.random.default_rng(1)
+    weight_sets = pd.DataFrame(
+        rng.dirichlet(np.ones(len(FACTORS)), size=5),
+        columns=FACTORS,
+        index=[f"set{i}" for i in range(5)],
+    )
+
+    scores = score_stocks(df, weight_sets)
+
+    assert list(scores.columns) == list(weight_sets.index)
+    for name, weights in weight_sets.iterrows():
+        expected = sum(
+            df[factor] * weight for factor, weight in weights.items()
+        )
+        np.testing.assert_allclose(scores[name], expected)
+    np.testing.assert_allclose(
+        score_stocks(df, weight_sets.loc["set2"]), scores["set2"]
+    )
+
+
+def test_score_stocks_counts_missing_factors_as_zero():
+    df = _percentiles()
+    weights = {"forwardPE": 0.5, "quarterlyReturn": 0.5}
+    weight_sets = pd.DataFrame([FACTOR_WEIGHTS, weights], index=["a", "b"])
+
+    scores = score_stocks(df, weight_sets)
+
+    assert weight_sets.loc["b"].isna().sum() == len(FACTORS) - 2
+    np.testing.assert_allclose(
+        scores["b"], 0.5 * df["forwardPE"] + 0.5 * df["quarterlyReturn"]
+    )
+    np.testing.assert_allclose(scores["b"], score_stocks(df, weights))
+    np.testing.assert_allclose(scores["a"], score_stocks(df))
+
+
+def test_rank_orders_puts_stocks_without_a_score_last():
+    scores = pd.DataFrame(
+        {
+            "a": [1.0, np.nan, 3.0, 2.0, np.nan],
+            "b": [np.nan, 5.0, 5.0, 4.0, 6.0],
+        },
+        index=["V", "W", "X", "Y", "Z"],
+    )
+
+    orders = rank_orders(scores)
+
+    assert orders["a"].tolist() == ["X", "Y", "V", "W", "Z"]
+    assert orders["b"].tolist() == ["Z", "W", "X", "Y", "V"]
+    symbols = pd.Series(["v", "w", "x", "y", "z"])
+    assert rank_orders(scores["a"], symbols)["a"].tolist() == [
+        "x", "y", "v", "w", "z"
+    ]
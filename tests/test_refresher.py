@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+import refresher
+
+
+def _busy_then(outcomes):
+    """
+    Returns a fake `refresh_index` that reports another process
+    refreshing the index first and then gives the next outcomes.
+    """
+    calls = []
+
+    def refresh_index(index, refresh_dir):
+        os.makedirs(os.path.join(refresh_dir, index), exist_ok=True)
+        open(os.path.join(refresh_dir, index, ".lock"), "a").close()
+        calls.append(index)
+        outcome = outcomes[len(calls) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return refresh_index, calls
+
+
+def test_get_snapshot_refreshes_when_another_refresh_failed(
+    tmp_path, monkeypatch
+):
+    fake, calls = _busy_then([False, ConnectionError("rate limited")])
+    monkeypatch.setattr(refresher, "refresh_index", fake)
+
+    with pytest.raises(RuntimeError, match="rate limited"):
+        refresher.get_snapshot("dow", refresh_dir=str(tmp_path))
+    assert calls == ["dow", "dow"]
+
+
+def test_get_snapshot_raises_without_any_snapshot(tmp_path, monkeypatch):
+    fake, _ = _busy_then([False, False])
+    monkeypatch.setattr(refresher, "refresh_index", fake)
+
+    with pytest.raises(RuntimeError, match="could not be refreshed"):
+        refresher.get_snapshot("dow", refresh_dir=str(tmp_path))
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from optimizer import RiskModel, size_sweep
+from risk_model import OnlineRiskModel, update_state
+
+
+def _prices(days=60, tickers=("AAA", "BBB", "CCC", "DDD"), seed=0):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0005, 0.01, size=(days, len(tickers)))
+    return pd.DataFrame(
+        100 * np.cumprod(1 + returns, axis=0),
+        index=pd.bdate_range("2023-01-02", periods=days),
+        columns=list(tickers),
+    )
+
+
+def test_update_state_skips_columns_with_gaps(tmp_path):
+    prices = _prices()
+    panel = prices.assign(EMPTY=np.nan, LATE=prices["AAA"])
+    panel.loc[panel.index[:40], "LATE"] = np.nan
+    panel.loc[panel.index[10:15], "BBB"] = np.nan
+
+    estimator = update_state(str(tmp_path / "state.npz"), panel)
+
+    assert estimator.tickers == ["AAA", "BBB", "CCC", "DDD"]
+    expected = RiskModel(panel[estimator.tickers].ffill()).sample_cov
+    pd.testing.assert_frame_equal(estimator.cov(), expected)
+    risk_model = OnlineRiskModel(estimator, ["AAA", "BBB", "CCC"])
+    assert sum(risk_model.hrp().values()) == pytest.approx(1.0)
+
+
+def test_update_state_adds_new_days(tmp_path):
+    path = str(tmp_path / "state.npz")
+    prices = _prices(days=80).assign(EMPTY=np.nan)
+    update_state(path, prices.iloc[:60])
+
+    estimator = update_state(path, prices)
+
+    assert estimator.count == 79
+    expected = RiskModel(prices.drop(columns="EMPTY")).sample_cov
+    pd.testing.assert_frame_equal(estimator.cov(), expected)
+
+
+def test_size_sweep_estimates_each_size_from_its_own_history():
+    prices = _prices(days=120, tickers=("A", "B", "C", "D", "E", "F"))
+    prices.loc[prices.index[:50], "E"] = np.nan
+    prices.loc[prices.index[:80], "F"] = np.nan
+    ranked = ["B", "A", "C", "E", "D", "F"]
+
+    curve, weights = size_sweep(prices, ranked)
+
+    for size in curve.index:
+        risk_model = RiskModel(prices[ranked[:size]])
+        expected = risk_model.hrp()
+        np.testing.assert_allclose(
+            weights.loc[size, list(expected)], list(expected.values())
+        )
+        np.testing.assert_allclose(
+            curve.loc[size, ["expected_annual_return", "annual_volatility"]],
+            risk_model.performance(expected)[:2],
+        )
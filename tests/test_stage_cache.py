@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import batch
+import stage_cache
+from stage_cache import StageCache, fingerprint
+from ranking import FACTORS
+
+SYMBOLS = [f"S{i:02d}" for i in range(12)]
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    """Replaces the network stages of the batch pipeline."""
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=300)
+    prices = pd.DataFrame(
+        100 * np.cumprod(1 + rng.normal(0.0005, 0.01, (300, 12)), axis=0),
+        index=dates,
+        columns=SYMBOLS,
+    )
+    fundamentals_data = pd.DataFrame(
+        rng.normal(size=(12, len(FACTORS) - 1)), columns=FACTORS[:-1]
+    )
+    fundamentals_data.insert(0, "symbol", SYMBOLS)
+    monkeypatch.setattr(
+        batch, "scrape_company_tickers", lambda url: pd.Series(SYMBOLS)
+    )
+
+    def collect_data(symbols):
+        # As `collect_data` does, return the symbols column itself
+        data = fundamentals_data.copy()
+        return data, data["symbol"]
+
+    monkeypatch.setattr(batch, "collect_data", collect_data)
+    monkeypatch.setattr(
+        batch,
+        "download_price_panel",
+        lambda tickers, start=None, end=None: prices[list(tickers)],
+    )
+
+
+def _run(cache):
+    return batch.run_batch("dow", 5, 10000, cache=cache)
+
+
+def test_rerun_hits_every_stage(offline, tmp_path):
+    first = _run(StageCache(str(tmp_path)))
+
+    cache = StageCache(str(tmp_path))
+    again = _run(cache)
+    assert set(cache.stats()["disk_hits"]) == {1}
+    assert set(cache.stats()["misses"]) == {0}
+
+    _run(cache)
+    assert set(cache.stats()["memory_hits"]) == {1}
+    assert set(cache.stats()["misses"]) == {0}
+    assert again["weights"] == first["weights"]
+
+
+def test_rerun_in_a_new_process_hits_every_stage(
+    offline, tmp_path, monkeypatch
+):
+    _run(StageCache(str(tmp_path)))
+    # A new process has no fingerprints recorded
+    monkeypatch.setattr(stage_cache, "_fingerprints", {})
+
+    cache = StageCache(str(tmp_path))
+    _run(cache)
+
+    assert set(cache.stats()["misses"]) == {0}
+
+
+def test_fingerprint_is_that_of_the_content():
+    frame = pd.DataFrame({"a": [1.0, 2.0]})
+    cache = StageCache(None)
+
+    result = cache.run("copy", lambda f: f.copy(), frame)
+
+    assert fingerprint(result) == fingerprint(frame.copy())
+    assert fingerprint((result, 1)) == fingerprint((frame.copy(), 1))
+
+
+@pytest.mark.parametrize("value", [1.5, np.float64(2.5), None])
+def test_stage_results_need_not_be_iterable(tmp_path, value):
+    StageCache(str(tmp_path)).run("scalar", lambda: value)
+
+    cache = StageCache(str(tmp_path))
+
+    assert cache.run("scalar", lambda: value) == value
+    assert cache.stats().loc["scalar", "disk_hits"] == 1
@@ -0,0 +1,184 @@
+"""
+Timed spans around the steps of the program, written out as a trace
+file that can be opened in Perfetto (https://ui.perfetto.dev) or
+chrome://tracing.
+
+Tracing is off unless the INVESTIQ_TRACE environment variable names
+a directory to write the trace files to, or `enable` is called. While
+it is off, `span` returns a shared do-nothing context manager and
+`traced` functions call straight through, so the instrumentation
+costs one flag check per call. Setting INVESTIQ_TRACE_MEMORY=1 also
+records the memory allocated in every span, using tracemalloc.
+
+Usage:
+    INVESTIQ_TRACE=traces python run.py
+"""
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+# Directory to write a trace file per run to, or unset to not trace
+TRACE_DIR = os.environ.get("INVESTIQ_TRACE")
+# Whether to record memory use with tracemalloc while tracing
+TRACE_MEMORY = os.environ.get("INVESTIQ_TRACE_MEMORY") == "1"
+
+_enabled = False
+_memory = False
+_trace_dir = None
+_events = []
+_thread_names = {}
+_runs = 0
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """
+    Records the time, and the memory if enabled, between entering and
+    leaving it as one complete event of the trace.
+    """
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        thread = threading.current_thread()
+        self.tid = thread.ident
+        _thread_names.setdefault(self.tid, thread.name)
+        if _memory:
+            self.memory = tracemalloc.get_traced_memory()[0]
+        self.started = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        ended = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args["error"] = repr(exc)
+        event = {
+            "name": self.name,
+            "ph": "X",
+            "ts": self.started / 1000,
+            "dur": (ended - self.started) / 1000,
+            "pid": os.getpid(),
+            "tid": self.tid,
+            "args": self.args,
+        }
+        if _memory and tracemalloc.is_tracing():
+            memory = tracemalloc.get_traced_memory()[0]
+            self.args["allocated"] = memory - self.memory
+            _events.append({
+                "name": "memory",
+                "ph": "C",
+                "ts": ended / 1000,
+                "pid": os.getpid(),
+                "args": {"traced": memory},
+            })
+        _events.append(event)
+        return False
+
+
+def enable(trace_dir, memory=False):
+    """
+    Starts tracing, writing the trace files to `trace_dir`, and
+    starts tracemalloc if `memory` is true.
+    """
+    global _enabled, _memory, _trace_dir
+    _trace_dir = trace_dir
+    _memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _enabled = True
+
+
+def disable():
+    """Stops tracing. Spans recorded so far are kept until `write`."""
+    global _enabled, _memory
+    if _memory:
+        tracemalloc.stop()
+    _enabled = False
+    _memory = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def span(name, **args):
+    """
+    Returns a context manager that records the code it wraps as a
+    span called `name`, with `args` shown alongside it.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def traced(function):
+    """
+    Decorates a function so that every call to it is recorded as a
+    span named after the function.
+    """
+    name = function.__qualname__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return function(*args, **kwargs)
+        with _Span(name, {}):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+def write():
+    """
+    Writes the spans recorded since the last call to a new trace
+    file in the trace directory, and clears them.
+
+    Returns:
+        str: The path of the trace file, or None if nothing was
+        recorded.
+    """
+    global _runs
+    if not _events or _trace_dir is None:
+        return None
+    events = _events[:]
+    del _events[:len(events)]
+    events.extend(
+        {
+            "name": "thread_name",
+            "ph": "M",
+            "pid": os.getpid(),
+            "tid": tid,
+            "args": {"name": name},
+        }
+        for tid, name in _thread_names.items()
+    )
+    _runs += 1
+    os.makedirs(_trace_dir, exist_ok=True)
+    path = os.path.join(
+        _trace_dir,
+        "trace-{}-{}-{}.json".format(
+            time.strftime("%Y%m%d-%H%M%S"), os.getpid(), _runs
+        ),
+    )
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return path
+
+
+if TRACE_DIR:
+    enable(TRACE_DIR, TRACE_MEMORY)
@@ -1,27 +1,21 @@
-from math import sqrt
 import pandas as pd
-import pandas_datareader.data as web
-import numpy as np
-import random
-from functools import reduce
 import datetime as dt
-from datetime import datetime
-import yfinance as yf
-from yahoo_fin import stock_info as si
-import scipy.stats as stats
-from pypfopt.expected_returns import mean_historical_return
-from pypfopt.risk_models import CovarianceShrinkage
-from pypfopt.efficient_frontier import EfficientFrontier
-from pypfopt.discrete_allocation import DiscreteAllocation, get_latest_prices
-from pypfopt import HRPOpt
-import requests
 import time
-from urllib.error import HTTPError
+from allocation import allocate
+from constituents import INDEX_URLS, get_constituents
+from fundamentals import fetch_fundamentals
+from fundamentals_table import FundamentalsTable, rank_table
+from momentum import horizon_returns
+from optimizer import RiskModel, size_sweep
+from price_cache import cached_price_panel
+from ranking import FACTORS, score_stocks
+from tracing import traced
 
-# The start and end date range for the stock data we will be analyzing
-start = dt.datetime.now() - dt.timedelta(days=365)
-end = dt.datetime.now()
-index_choice = ""
+# yfinance and PyPortfolioOpt (which loads cvxpy) take seconds to import,
+# so they are imported inside the functions that use them instead of here
+
+# The length of the window of stock prices we will be analyzing
+PRICE_WINDOW = dt.timedelta(days=365)
 
 
 def get_companies_list():
@@ -46,7 +40,7 @@ def get_companies_list():
 
     # URL of the Wikipedia page from which to scrape
     # the Dow Jones company list
-    url_dow = "https://en.wikipedia.org/wiki/Dow_Jones_Industrial_Average"
+    url_dow = INDEX_URLS["dow"]
 
     typewriter("------------------------------------\n")
     typewriter("  Step 1: Constructing Your Index   \n")
@@ -108,14 +102,17 @@ def validate_index(index_choice):
     return True
 
 
+@traced
 def scrape_company_tickers(index):
     """
     Extract the company tickers from an index's Wikipedia page.
 
     This function copies the stock tickers from the Dow Jones Industrial
-    Average index pages on Wikipedia.
-    It pulls the tables from the Wikipedia page using
-    pandas and then extracts the ticker symbols from the 'Symbol' column.
+    Average, S&P 100 or S&P 500 index pages on Wikipedia, through the
+    `get_constituents` function of the constituents module. The list
+    is cached, so the page is only scraped again once the cached list
+    is out of date, and a saved list is used if the page cannot be
+    reached.
 
     Parameters:
     index (str): The URL of the Wikipedia page of the index.
@@ -126,24 +123,25 @@ def scrape_company_tickers(index):
     symbols (Series): A pandas Series containing the ticker
     symbols of the companies in the index.
     """
-    if index == "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies":
-        tables = pd.read_html(index)
-        tabel = tables[0]
-        symbols = tabel["Symbol"]
-    elif index == "https://en.wikipedia.org/wiki/S%26P_100":
-        tables = pd.read_html(index)
-        tabel = tables[2]
-        symbols = tabel["Symbol"]
-    elif index == "https://en.wikipedia.org/wiki/Dow_Jones_Industrial_Average":
-        tables = pd.read_html(index)
-        tabel = tables[1]
-        symbols = tabel["Symbol"]
+    index_names = {url: name for name, url in INDEX_URLS.items()}
+    symbols = get_constituents(index_names[index])
     return symbols
 
 
+@traced
 def collect_data(symbols):
     """
-    Retrieves and processes financial data for the Dow Jones.
+    Retrieves and processes financial data for the companies
+    in the chosen index.
+
+    The fundamentals of every company are fetched concurrently
+    from yfinance with the `fetch_fundamentals` function from the
+    fundamentals module, which limits the rate of requests and
+    retries failed ones. Companies that could not be fetched are
+    reported, and taken from the local `fundamentals_data_dow.csv`
+    backup where it has them. If no company could be fetched at
+    all, for example because the yfinance rate limit was reached,
+    the program reverts to the Dow Jones data from the csv.
 
     Args:
         symbols (list): A list of strings representing the
@@ -155,80 +153,155 @@ def collect_data(symbols):
         The DataFrame's columns correspond to the
         selected financial metrics, and its rows correspond
         to the stock symbols.
-    Raises:
-        KeyError: If the fetched data does not contain
-        one of the chosen financial measures.
+        pandas.Series: The stock symbols of the rows.
     """
+    symbols = list(symbols)
+    fundamentals_data, failures = fetch_fundamentals(symbols)
+    backup_data = pd.read_csv('fundamentals_data_dow.csv')
 
-    fundamentals_data = pd.read_csv('fundamentals_data_dow.csv')
+    if fundamentals_data.empty:
+        print("Could not retrieve any fundamentals - using the saved\
+ Dow Jones data instead.")
+        fundamentals_data = backup_data
+    elif failures:
+        print(
+            f"Could not retrieve fundamentals for {len(failures)} of\
+ {len(symbols)} companies: {', '.join(failures)}"
+        )
+        backup_rows = backup_data[backup_data["symbol"].isin(failures)]
+        fundamentals_data = pd.concat(
+            [fundamentals_data, backup_rows], ignore_index=True
+        )
     symbols = fundamentals_data["symbol"]
     return fundamentals_data, symbols
 
 
-def process_data(tickers, start=start, end=end):
+def price_window(start=None, end=None):
     """
-    Processes a list of stock tickers by calculating
-    their quarterly returns.
-
-    This function uses the 'calculate_quarterly_return'
-    function to iteratively calculate the quarterly return
-    for each stock ticker in a list of tickers.
-    The calculation's beginning and ending dates are
-    specified in the file.
-    Lists of the calculated returns are returned
-    by the function.
+    Returns the start and end dates of the price window. The window
+    is the `PRICE_WINDOW` up to the moment of the call, so a process
+    that runs for days always analyses the latest prices.
 
     Args:
-        tickers (list): A list of strings representing
-        the stock tickers to process.
+        start (datetime, optional): A start date to use instead.
+        end (datetime, optional): An end date to use instead.
 
     Returns:
-        list: A list of floats representing the calculated
-        quarterly returns for each stock ticker.
+        datetime: The start date of the window.
+        datetime: The end date of the window.
     """
-    returns_list = []
-    for ticker in tickers:
-        returns_list.append(calculate_quarterly_return(ticker, start, end))
-    return returns_list
+    now = dt.datetime.now()
+    return start or now - PRICE_WINDOW, end or now
 
 
-def calculate_quarterly_return(ticker, start, end):
+@traced
+def download_price_panel(tickers, start=None, end=None):
     """
-    Determines the quarterly return for a
-    specific stock ticker over a given time period.
+    Builds the adjusted close prices for a whole list of
+    tickers, using the local price cache where possible.
 
-    Using the yfinance package, this function downloads
-    historical data for a specified stock ticker, resamples the
-    data to a quarterly frequency, and then computes the percentage
-    change in the adjusted closing price.
-    The function outputs the last quarterly return.
+    Prices that are already stored in the price cache are read
+    from disk, and only the days that are missing since the last
+    sync are downloaded, with one batched request per group of
+    tickers. The resulting panel is shared by the quarterly return
+    calculation (Step 2) and the portfolio optimization (Step 3),
+    so no further downloads are needed once it has been built.
 
     Args:
-        ticker (str): A string representing the stock ticker
-        to fetch data for.
-        start (str): A string representing the start date
-        for the data fetch in 'YYYY-MM-DD' format.
-        end (str): A string representing the end date for
-        the data fetch in 'YYYY-MM-DD' format.
+        tickers (list): A list of strings representing the
+        stock tickers to fetch prices for.
+        start (datetime, optional): The start date of the price
+        window. Defaults to the start of `price_window()`.
+        end (datetime, optional): The end date of the price window.
+        Defaults to now.
 
     Returns:
-        float: The quarterly return for the quarter ending
-        on '2023-06-30', or np.nan if the data fetch fails.
+        pd.DataFrame: A DataFrame indexed by date with one column
+        of adjusted close prices per ticker. Tickers that failed
+        to download are present as columns of NaN.
+    """
+    start, end = price_window(start, end)
+    return cached_price_panel(tickers, start, end, fetch_price_panel)
 
-    Raises:
-        Exception: If the data fetch fails for any reason.
+
+@traced
+def fetch_price_panel(tickers, start, end):
     """
+    Downloads the adjusted close prices for a whole list of
+    tickers in a single batched request.
+
+    Rather than calling yfinance once per ticker, this function
+    passes every ticker to `yf.download` at once and keeps the
+    "Adj Close" prices.
+
+    Args:
+        tickers (list): A list of strings representing the
+        stock tickers to fetch prices for.
+        start (datetime): The start date of the price window.
+        end (datetime): The end date of the price window.
+
+    Returns:
+        pd.DataFrame: A DataFrame indexed by date with one column
+        of adjusted close prices per ticker. Tickers that failed
+        to download are present as columns of NaN.
+    """
+    import yfinance as yf
+
+    tickers = list(tickers)
     try:
-        data = yf.download(ticker, start=start, end=end, progress=False)
-        data["quarterly_return"] = \
-            data["Adj Close"].resample("Q").ffill().pct_change()
-        return data.loc["2023-06-30", "quarterly_return"]
+        data = yf.download(tickers, start=start, end=end, progress=False)
+        prices = data["Adj Close"]
     except Exception as e:
         print(
-            f"Failed to download data for {ticker}. Error: {e} - continuing\
-            with remaining tickers."
+            f"Failed to download pricing data. Error: {e} - continuing\
+ without prices."
         )
-        return np.nan
+        return pd.DataFrame(columns=tickers, dtype=float)
+
+    # A single ticker comes back as a Series rather than a DataFrame
+    if isinstance(prices, pd.Series):
+        prices = prices.to_frame(tickers[0])
+    return prices.reindex(columns=tickers)
+
+
+@traced
+def process_data(tickers, start=None, end=None, prices=None):
+    """
+    Processes a list of stock tickers by calculating
+    their quarterly returns.
+
+    The returns of every ticker are calculated together from the
+    price panel by `horizon_returns`, as of the `end` date, so each
+    is the return of the last calendar quarter completed by then.
+    Tickers without prices for the whole quarter get np.nan.
+
+    Args:
+        tickers (list): A list of strings representing
+        the stock tickers to process.
+        start (datetime, optional): The first date of prices
+        downloaded when `prices` is not supplied.
+        end (datetime, optional): The date the returns are
+        calculated at. Defaults to now.
+        prices (pd.DataFrame, optional): A price panel from
+        `download_price_panel`. If not supplied, one is
+        downloaded for the tickers.
+
+    Returns:
+        list: A list of floats representing the calculated
+        quarterly returns for each stock ticker.
+    """
+    start, end = price_window(start, end)
+    if prices is None:
+        prices = download_price_panel(tickers, start, end)
+    quarterly_return = horizon_returns(prices, as_of=end)["quarterlyReturn"]
+    quarterly_return = quarterly_return.reindex(tickers)
+    missing = quarterly_return.index[quarterly_return.isna()]
+    if len(missing):
+        print(
+            f"Failed to calculate the return for {', '.join(missing)} -\
+ continuing with remaining tickers."
+        )
+    return quarterly_return.tolist()
 
 
 def fundamentals_information():
@@ -476,47 +549,6 @@ value over the quarter.\n
                 after your number")
 
 
-def calculate_percentile_rank(df):
-    """
-    Calculates the percentile rank for each value in the DataFrame.
-
-    Determines each value's percentile rating for the DataFrame.
-    Each value in the DataFrame is subjected to this function's application
-    of the percentileofscore function from the scipy.stats module.
-    The percentage of values in the DataFrame that are less than or equal
-    to a certain value is known as the percentile rank of that value.
-    The function then reverses the percentile ranks for the columns
-    "forwardPE" and "debtToEquity," where a lower value is preferred.
-    With the values replaced by their percentile ranks, the function
-    produces a DataFrame with the same shape as the input DataFrame.
-
-    Args:
-        df (pd.DataFrame): A DataFrame containing the values for which
-        to calculate percentile ranks.
-
-    Returns:
-        pd.DataFrame: A DataFrame of the same shape as the input DataFrame,
-        but with the values replaced by their percentile ranks.
-
-    """
-    typewriter("------------------------------------\n")
-    typewriter("  Step 2: Ranking Your Companies       \n")
-    typewriter("------------------------------------\n")
-    ranked_percentiles = df.apply(
-        lambda x: [
-            stats.percentileofscore(x, a, "rank") if pd.notnull(a) else np.nan
-            for a in x
-        ]
-    )
-    columns_to_inverse = ["forwardPE", "debtToEquity"]
-
-    for column in columns_to_inverse:
-        if column in ranked_percentiles:
-            ranked_percentiles[column] = 100 - ranked_percentiles[column]
-    ranked_percentiles = ranked_percentiles.round(2)
-    return ranked_percentiles
-
-
 # rank the stocks by percentiles
 def rank_stocks(df):
     """
@@ -524,7 +556,8 @@ def rank_stocks(df):
     supplied.
 
     The score is the sum of the products of each factor's weight and
-    its respective weighting for each factor.
+    its respective weighting for each factor, calculated by the
+    `score_stocks` function from the ranking module.
     Aspects considered include Forward PE, Forward EPS, Debt to Equity,
     Return on Equity, Return on Assets, Revenue Growth, Quick Ratio, and
     Quarterly Return.
@@ -544,25 +577,50 @@ def rank_stocks(df):
     column 'score' that contains the
     calculated score for each stock.
     """
-    df["score"] = (
-        df["forwardPE"] * 0.1
-        + df["forwardEps"] * 0.1
-        + df["debtToEquity"] * 0.1
-        + df["returnOnEquity"] * 0.1
-        + df["returnOnAssets"] * 0.1
-        + df["revenueGrowth"] * 0.2
-        + df["quickRatio"] * 0.1
-        + df["quarterlyReturn"] * 0.2
-    )
+    df["score"] = score_stocks(df)
+
+
+@traced
+def rank_companies(fundamentals_data):
+    """
+    Scores and ranks the companies in the fundamentals table.
 
+    Companies with missing data are removed, the remaining
+    fundamentals are converted into percentile ranks with the
+    `percentile_rank` function from the ranking module, and each
+    company is scored with `score_stocks`. The percentile ranks of
+    "forwardPE" and "debtToEquity" are reversed, as lower values
+    are preferred for those columns. The ranking is done on a
+    `FundamentalsTable`, whose factor columns are views of one
+    array, rather than on copies of the DataFrame.
 
-def choose_companies(df):
+    Args:
+        fundamentals_data (pd.DataFrame): A DataFrame containing the
+        fundamentals and quarterly return of each company, with
+        the ticker symbols in a 'symbol' column.
+
+    Returns:
+        pd.DataFrame: A DataFrame of the companies sorted from the
+        highest to the lowest score, with a 'symbols' column, a
+        'score' column and the percentile rank of each factor.
+        int: The number of companies removed due to missing data.
+    """
+    table = FundamentalsTable.from_frame(fundamentals_data)
+    ranking, removed_companies = rank_table(table, dtype=float)
+    return ranking.to_frame("symbols"), removed_companies
+
+
+@traced
+def choose_companies(df, prices=None):
     """
     Prompts the user to select the number of companies to include
     in the portfolio from the ranked list.
 
     The user and this function communicate to decide how many
     top-ranked businesses the user wants to put in their portfolio.
+    If the price panel is given, a table of the expected return,
+    volatility and Sharpe ratio of every portfolio size is shown
+    first, so the user can pick a size from it.
     A number is requested from the user, which is then checked
     to see if it falls within the permitted range.
     Up until a valid input is obtained, the function keeps
@@ -571,6 +629,8 @@ def choose_companies(df):
     Args:
         df (pd.DataFrame): A DataFrame containing the
         ranked list of companies.
+        prices (pd.DataFrame, optional): A price panel covering
+        the ranked companies.
 
     Returns:
         None. This function is used for its side effect of
@@ -593,6 +653,8 @@ def choose_companies(df):
  from this list \n")
     typewriter("-------------------------------------------\
 ----------------\n")
+    if prices is not None:
+        print_size_sweep(df, prices)
     typewriter(
         "You must choose 3 or more and the number cannot\
  be greater than the total \nnumber of companies listed\
@@ -617,6 +679,40 @@ def choose_companies(df):
     return portfolio_df
 
 
+def print_size_sweep(df, prices):
+    """
+    Prints the expected annual return, annual volatility and Sharpe
+    ratio of the HRP portfolio of every number of top-ranked
+    companies, calculated in one pass by the `size_sweep` function
+    of the optimizer module.
+
+    Args:
+        df (pd.DataFrame): A DataFrame containing the
+        ranked list of companies.
+        prices (pd.DataFrame): A price panel covering the
+        ranked companies.
+
+    Returns:
+        None
+    """
+    try:
+        curve, _ = size_sweep(prices, df["symbols"])
+    except Exception as e:
+        print(f"Could not calculate the portfolio sizes. Error: {e}")
+        return
+    typewriter("This is how each portfolio size is expected to perform:\n")
+    curve[["expected_annual_return", "annual_volatility"]] *= 100
+    print(
+        curve.round(2).rename(
+            columns={
+                "expected_annual_return": "Return (%)",
+                "annual_volatility": "Volatility (%)",
+                "sharpe_ratio": "Sharpe Ratio",
+            }
+        )
+    )
+
+
 def validate_number(portfolio_size, df):
     """
     Validates the number of companies chosen by the user for
@@ -657,60 +753,25 @@ def validate_number(portfolio_size, df):
     return True
 
 
-def pull_returns(ticker, start, end):
-    """
-    Retrieves, for a given ticker symbol and time frame,
-    the historical adjusted close prices.
-
-    This function downloads historical pricing information
-    for a particular ticker symbol using the yfinance library.
-    The obtained data is then used to extract the
-    "Adj Close" prices.
-    If the data download fails for any reason, the
-    function handles the exception and returns NaN.
-
-    Args:
-        ticker (str): The ticker symbol of the company
-        for which to fetch the historical pricing data.
-        start (str): The start date of the date range
-        for which to fetch the data, in the format
-        'YYYY-MM-DD'.
-        end (str): The end date of the date range for
-        which to fetch the data, in the format 'YYYY-MM-DD'.
-
-    Returns:
-        pd.Series: A pandas Series containing the historical
-        adjusted close prices for the given ticker symbol,
-                   indexed by date. If the data download
-                   fails, returns NaN.
-    """
-    try:
-        print(f"Fetching pricing data for {ticker}")
-        data = yf.download(ticker, start=start, end=end, progress=False)
-        return data["Adj Close"]
-    except Exception as e:
-        print(
-            f"Failed to download data for {ticker}. Error:\
- {e} - continuing with remaining tickers."
-        )
-        return np.nan
-
-
-def combine_stocks(tickers):
+@traced
+def combine_stocks(tickers, prices=None):
     """
-    Fetches the historical prices for a list of ticker
+    Selects the historical prices for a list of ticker
     symbols and combines them into a single DataFrame.
 
-    This function iterates over a list of ticker symbols,
-    fetches the historical prices for each symbol using the
-    pull_returns function, and combines these price series
-    into a single DataFrame. The DataFrame is then returned
-    for further processing. This data is used to calculate
-    expected returns and variance for portfolio optimization.
+    The prices are taken from the price panel that was already
+    downloaded for the whole index, so no further requests are
+    made. If no panel is supplied, the prices for the tickers
+    are downloaded in one batched request instead. The DataFrame
+    is then returned for further processing. This data is used
+    to calculate expected returns and variance for portfolio
+    optimization.
 
     Args:
         tickers (list): A list of ticker symbols for which
         to fetch the historical prices.
+        prices (pd.DataFrame, optional): A price panel from
+        `download_price_panel` covering the tickers.
 
     Returns:
         pd.DataFrame: A DataFrame where each column
@@ -722,22 +783,15 @@ def combine_stocks(tickers):
     typewriter(" Step 3: Optimizing Your Portfolio  \n")
     typewriter("------------------------------------\n")
     typewriter(
-        "InvestIQ needs to fetch the historical prices\
+        "InvestIQ uses the historical prices\
  of your porfolio companies. \n"
     )
     typewriter("This is used to calculate expected returns\
  and your variance: \n")
-    data_frames = pd.DataFrame()
-    for i in tickers:
-        data_frames[i] = pull_returns(i, start, end)
-        time.sleep(1)  # Add a delay of 1 second between each request
-
-    if index_choice == "dow":
-        data_frames.to_csv('pricing_data_dow.csv', index=False)
-    elif index_choice == "sap100":
-        data_frames.to_csv('pricing_data_sap100.csv', index=False)
-    elif index_choice == "sap500":
-        data_frames.to_csv('pricing_data_sap500.csv', index=False)
+    if prices is None:
+        print("Fetching pricing data for " + ", ".join(tickers))
+        prices = download_price_panel(tickers)
+    data_frames = prices[list(tickers)].copy()
     return data_frames
 
 
@@ -788,10 +842,7 @@ def hpp_optimization(portfolio_prices, latest_prices):
     Returns:
         None
     """
-    port_returns = portfolio_prices.pct_change().dropna()
-    hrp = HRPOpt(port_returns)
-    hrp_weights = hrp.optimize()
-    weights = hrp.optimize()
+    weights, performance = optimize_portfolio(portfolio_prices)
     typewriter("-----------------------------------------\n")
     typewriter(" Step 4: Calculating Shares To Purchase  \n")
     typewriter("-----------------------------------------\n")
@@ -809,20 +860,79 @@ def hpp_optimization(portfolio_prices, latest_prices):
  9999999. Please try again.")
         except ValueError:
             print("Invalid input. Please enter a number.")
-    da = DiscreteAllocation(weights,
-                            latest_prices,
-                            total_portfolio_value=investment)
-    allocation, leftover = da.greedy_portfolio()
+    allocation, leftover = allocate_shares(weights, latest_prices, investment)
     print(
         "Your recommended allocation of shares\
  'stock':'number of shares'\n", allocation
     )
     print("Funds remaining: ${:.2f}".format(leftover))
     typewriter("--------------------------------------\n")
-    hrp.portfolio_performance(verbose=True)
+    print_performance(performance)
     typewriter("--------------------------------------\n")
 
 
+@traced
+def optimize_portfolio(portfolio_prices):
+    """
+    Calculates the Hierarchical Risk Parity (HRP) weights of a
+    portfolio and their expected performance, using the
+    `RiskModel` class of the optimizer module.
+
+    Args:
+        portfolio_prices (pd.DataFrame): A DataFrame containing
+        the historical prices for each stock in the portfolio.
+
+    Returns:
+        OrderedDict: The HRP weight of each stock.
+        tuple: The expected annual return, annual volatility and
+        Sharpe ratio of the portfolio.
+    """
+    risk_model = RiskModel(portfolio_prices)
+    weights = risk_model.hrp()
+    return weights, risk_model.performance(weights)
+
+
+@traced
+def allocate_shares(weights, latest_prices, investment, method="greedy"):
+    """
+    Converts portfolio weights into a number of shares to buy of
+    each stock for a given investment, using the allocation module.
+    By default this is the greedy_portfolio method of
+    PyPortfolioOpt's DiscreteAllocation.
+
+    Args:
+        weights (dict): The weight of each stock in the portfolio.
+        latest_prices (pd.Series): A Series containing the
+        latest prices for each stock in the portfolio.
+        investment (float): The total amount to invest.
+        method (str, optional): The allocation method, one of
+        'greedy', 'rounding' or 'exact'.
+
+    Returns:
+        dict: The number of shares to buy of each stock.
+        float: The funds remaining after buying the shares.
+    """
+    return allocate(weights, latest_prices, investment, method)
+
+
+def print_performance(performance):
+    """
+    Prints the expected annual return, annual volatility and
+    Sharpe ratio of a portfolio.
+
+    Args:
+        performance (tuple): The expected annual return, annual
+        volatility and Sharpe ratio of the portfolio.
+
+    Returns:
+        None
+    """
+    expected_return, volatility, sharpe = performance
+    print("Expected annual return: {:.1f}%".format(100 * expected_return))
+    print("Annual volatility: {:.1f}%".format(100 * volatility))
+    print("Sharpe Ratio: {:.2f}".format(sharpe))
+
+
 def reset_program():
     """
     Resets the program and provides the user with options to